@@ -0,0 +1,50 @@
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from modules.analysis import analyse_tracks, wave_decoder
+from modules.process_pool import ProcessPool
+
+
+def write_track(path, seconds, sample_rate, rng):
+    # silent intro, a beat-like body and a long fade-out, roughly what a TV-size OP looks like
+    time_axis = np.arange(int(seconds * sample_rate)) / sample_rate
+    beat = (np.sin(2 * np.pi * 2 * time_axis) > 0.9).astype(np.float32)
+    signal = 0.3 * np.sin(2 * np.pi * 440 * time_axis) * (0.4 + beat) + 0.05 * rng.standard_normal(len(time_axis))
+    envelope = np.clip(time_axis - 3, 0, 1) * np.clip((seconds - time_axis) / 15, 0, 1)
+    samples = (np.clip(signal * envelope, -1, 1) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as wavefile:
+        wavefile.setnchannels(1)
+        wavefile.setsampwidth(2)
+        wavefile.setframerate(sample_rate)
+        wavefile.writeframes(samples.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser('Throughput of the start offset analysis')
+    parser.add_argument('--tracks', type=int, default=48)
+    parser.add_argument('--seconds', type=float, default=90.0)
+    parser.add_argument('--sample-rate', type=int, default=11025)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        names = [f'{index:04d}.wav' for index in range(args.tracks)]
+        for name in names:
+            write_track(os.path.join(directory, name), args.seconds, args.sample_rate, rng)
+        for workers in args.workers:
+            with ProcessPool(workers) as pool:
+                start = time.perf_counter()
+                offsets = analyse_tracks(directory, names, pool, wave_decoder)
+                elapsed = time.perf_counter() - start
+            print(f'workers={workers}: {args.tracks / elapsed:.1f} tracks/s '
+                  f'({args.tracks * args.seconds / elapsed:.0f}x realtime), sample offsets: {offsets[0][0]}')
+
+
+if __name__ == '__main__':
+    main()
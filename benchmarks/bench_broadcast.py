@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+
+from modules.broadcast import BroadcastServer
+
+
+async def _client(port, messages, latencies, connected):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    # any first line that is not an HTTP request selects the raw JSON lines protocol without waiting
+    writer.write(b'\n')
+    await reader.readline()
+    connected.release()
+    received = 0
+    while received < messages:
+        message = json.loads(await reader.readline())
+        sent = message['diff'].get('sent')
+        if sent is not None:
+            latencies.append((message['seq'], time.perf_counter() - sent))
+            received += 1
+    writer.close()
+
+
+async def _swarm(port, clients, messages, ready):
+    connected = asyncio.Semaphore(0)
+    latencies = [[] for _ in range(clients)]
+    tasks = [asyncio.create_task(_client(port, messages, latencies[client], connected)) for client in range(clients)]
+    for _ in range(clients):
+        await connected.acquire()
+    ready.set()
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def swarm_process(port, clients, messages, ready, results):
+    results.put(asyncio.run(_swarm(port, clients, messages, ready)))
+
+
+def run(clients, messages, interval, processes):
+    server = BroadcastServer('127.0.0.1', 0)
+    server.start()
+    results = multiprocessing.Queue()
+    # the swarm runs in other processes, so client parsing does not compete with the server for the GIL
+    swarms = []
+    for number in range(processes):
+        ready = multiprocessing.Event()
+        swarm_clients = clients // processes + (number < clients % processes)
+        swarm = multiprocessing.Process(target=swarm_process,
+                                        args=(server.port, swarm_clients, messages, ready, results))
+        swarm.start()
+        swarms.append((swarm, ready))
+    for _, ready in swarms:
+        ready.wait()
+    for number in range(messages):
+        server.update(time=number % 20, sent=time.perf_counter())
+        time.sleep(interval)
+    latencies = [client for _ in swarms for client in results.get()]
+    for swarm, _ in swarms:
+        swarm.join()
+    server.stop()
+
+    # fan-out latency of a message is the time until its last client has received it
+    fan_out = {}
+    for client in latencies:
+        for sequence, latency in client:
+            fan_out[sequence] = max(fan_out.get(sequence, 0.0), latency)
+    every = sorted(latency for client in latencies for _, latency in client)
+    last = sorted(fan_out.values())
+    return every[len(every) // 2], every[int(len(every) * 0.99)], last[len(last) // 2], last[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser('Fan-out latency of the broadcast server to a local client swarm')
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between state updates')
+    parser.add_argument('--processes', type=int, default=min(4, os.cpu_count()),
+                        help='processes the client swarm is spread over')
+    args = parser.parse_args()
+
+    print(f'{"clients":>8} {"p50 ms":>8} {"p99 ms":>8} {"fan-out p50 ms":>15} {"fan-out max ms":>15}')
+    for clients in args.clients:
+        p50, p99, fan_out_p50, fan_out_max = run(clients, args.messages, args.interval, args.processes)
+        print(f'{clients:>8} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {fan_out_p50 * 1000:>15.2f} '
+              f'{fan_out_max * 1000:>15.2f}')
+
+
+if __name__ == '__main__':
+    main()
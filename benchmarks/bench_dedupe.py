@@ -0,0 +1,62 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import fake_mp3
+from modules.dedupe import find_duplicates
+from modules.metadata_cache import CACHE_FILENAME
+from modules.process_pool import ProcessPool
+
+
+def make_collection(directory, files, size, duplicate_fraction, rng):
+    payloads = []
+    for index in range(files):
+        if payloads and rng.random() < duplicate_fraction:
+            # a re-rip: same audio, different tags and filename
+            payload = rng.choice(payloads)
+        else:
+            payload = rng.randbytes(size)
+            payloads.append(payload)
+        with open(os.path.join(directory, f'{index:06d}.mp3'), 'wb') as audiofile:
+            audiofile.write(fake_mp3(f'Artist {index}', f'Song {index}', 'Anime', frames=0) + payload)
+    return len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser('Content hash throughput of the duplicate finder')
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--size-mb', type=float, default=4.0, help='audio payload size per file')
+    parser.add_argument('--duplicates', type=float, default=0.1, help='fraction of files that copy another')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count()}))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='oped_dedupe_')
+    try:
+        unique = make_collection(directory, args.files, int(args.size_mb * (1 << 20)), args.duplicates,
+                                 random.Random(args.seed))
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.mp3'))
+        total = sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+        print(f'{len(names)} files, {total / (1 << 30):.2f} GiB, {len(names) - unique} duplicates')
+        print(f'{"workers":>8} {"cold s":>8} {"GB/s":>8} {"cached s":>9} {"groups":>7}')
+        for workers in args.workers:
+            cache = os.path.join(directory, CACHE_FILENAME)
+            if os.path.exists(cache):
+                os.remove(cache)
+            with ProcessPool(workers) as pool:
+                start = time.perf_counter()
+                groups = find_duplicates(directory, names, pool)
+                cold = time.perf_counter() - start
+                start = time.perf_counter()
+                find_duplicates(directory, names, pool)
+                cached = time.perf_counter() - start
+            print(f'{workers:>8} {cold:>8.2f} {total / cold / 1e9:>8.2f} {cached:>9.3f} {len(groups):>7}')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_analysis import write_track
+from modules.loudness import loudness_batches
+from modules.process_pool import ProcessPool
+
+
+def main():
+    parser = argparse.ArgumentParser('Throughput of the loudness analysis')
+    parser.add_argument('--tracks', type=int, default=48)
+    parser.add_argument('--seconds', type=float, default=90.0)
+    parser.add_argument('--sample-rate', type=int, default=22050)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count()}))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as directory:
+            names = [f'{index:04d}.wav' for index in range(args.tracks)]
+            for name in names:
+                write_track(os.path.join(directory, name), args.seconds, args.sample_rate, rng)
+            with ProcessPool(workers) as pool:
+                start = time.perf_counter()
+                loudness = {name: lufs for batch in loudness_batches(directory, names, pool) for name, lufs in
+                            batch.items()}
+                elapsed = time.perf_counter() - start
+                start = time.perf_counter()
+                for _ in loudness_batches(directory, names, pool):
+                    pass
+                cached = time.perf_counter() - start
+            print(f'workers={workers}: {args.tracks / elapsed:.1f} tracks/s '
+                  f'({args.tracks * args.seconds / elapsed:.0f}x realtime), cached pass {cached * 1000:.1f} ms, '
+                  f'median {np.median(list(loudness.values())):.1f} LUFS')
+
+
+if __name__ == '__main__':
+    main()
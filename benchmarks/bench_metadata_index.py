@@ -0,0 +1,48 @@
+import argparse
+import random
+import time
+
+from modules.metadata_index import MetadataIndex
+from modules.track import Track
+
+WORDS = ('gundam', 'shingeki', 'kyojin', 'love', 'live', 'sword', 'art', 'online', 'fullmetal', 'alchemist', 'bleach',
+         'naruto', 'shippuden', 'monogatari', 'blue', 'sky', 'heart', 'guren', 'no', 'yumiya', 'aimer', 'lisa')
+
+
+def make_tracks(size, rng):
+    def phrase(words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words)) + f' {rng.randrange(size)}'
+    return [(f'{index:07d}.mp3', Track(phrase(1), phrase(3), phrase(2))) for index in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser('Build and query cost of the metadata index')
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tracks = make_tracks(args.size, random.Random(args.seed))
+    start = time.perf_counter()
+    index = MetadataIndex(tracks)
+    print(f'build {args.size} tracks: {(time.perf_counter() - start) * 1000:.0f} ms')
+    print(f'{"query":>28} {"matches":>8} {"index ms":>9} {"scan ms":>8}')
+    for query in ('gundam', 'gun', 'anime:gundam', 'artist:aimer title:guren', 'l', 'sword art online', 'zzz'):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            matches = index.query(query)
+        indexed = (time.perf_counter() - start) / args.repeat
+        # what a filter costs without the index: a substring scan over every row
+        words = query.split()
+        start = time.perf_counter()
+        scanned = [name for name, track in tracks
+                   if all(word.partition(':')[2] in track[word.partition(':')[0]].casefold() if ':' in word
+                          else any(word in track[field].casefold() for field in ('anime', 'artist', 'title'))
+                          for word in words)]
+        scan = time.perf_counter() - start
+        print(f'{query:>28} {len(matches):>8} {indexed * 1000:>9.2f} {scan * 1000:>8.1f}')
+        del scanned
+
+
+if __name__ == '__main__':
+    main()
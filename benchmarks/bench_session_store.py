@@ -0,0 +1,89 @@
+import argparse
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+
+from modules.session_store import SessionStore
+
+
+def claim_worker(directory, room, tracks, claims, seed, start_event, results):
+    rng = random.Random(seed)
+    order = list(tracks)
+    rng.shuffle(order)
+    candidates = iter(order)
+    latencies = []
+    claimed = []
+    lost = 0
+    with SessionStore(directory, room) as store:
+        start_event.wait()
+        for _ in range(claims):
+            start = time.perf_counter()
+            # what Next and Play do: skip tracks claimed elsewhere, then claim the one that is played
+            track = next((candidate for candidate in candidates if not store.is_claimed(candidate)), None)
+            if track is None:
+                break
+            if store.claim(track):
+                claimed.append(track)
+            else:
+                lost += 1
+            latencies.append(time.perf_counter() - start)
+    results.put((room, claimed, latencies, lost))
+
+
+def run(directory, writers, rooms, tracks, claims, seed):
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=claim_worker,
+                                         args=(directory, f'room-{writer % rooms}', tracks, claims, seed + writer,
+                                               start_event, results))
+                 for writer in range(writers)]
+    for process in processes:
+        process.start()
+    # let every writer open its connection before the clock starts
+    time.sleep(0.5)
+    start = time.perf_counter()
+    start_event.set()
+    outcomes = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    per_room = {}
+    latencies = []
+    lost = 0
+    for room, claimed, worker_latencies, worker_lost in outcomes:
+        per_room.setdefault(room, []).extend(claimed)
+        latencies.extend(worker_latencies)
+        lost += worker_lost
+    duplicates = sum(len(claimed) - len(set(claimed)) for claimed in per_room.values())
+    latencies.sort()
+    total = sum(len(claimed) for claimed in per_room.values())
+    return total / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], duplicates, lost
+
+
+def main():
+    parser = argparse.ArgumentParser('Concurrent claim throughput of the shared session store')
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--rooms', type=int, default=2)
+    parser.add_argument('--tracks', type=int, default=10_000)
+    parser.add_argument('--claims', type=int, default=500, help='claims per writer process')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tracks = [f'{index:06d}.mp3' for index in range(args.tracks)]
+    print(f'{"writers":>8} {"claims/s":>10} {"p50 ms":>8} {"p99 ms":>8} {"duplicates":>11} {"lost races":>11}')
+    for writers in args.writers:
+        directory = tempfile.mkdtemp(prefix='oped_sessions_')
+        try:
+            throughput, p50, p99, duplicates, lost = run(directory, writers, args.rooms, tracks, args.claims,
+                                                         args.seed)
+            print(f'{writers:>8} {throughput:>10.0f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {duplicates:>11} '
+                  f'{lost:>11}')
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
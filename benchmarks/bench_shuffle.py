@@ -0,0 +1,59 @@
+import argparse
+import random
+import time
+
+from modules.shuffle import Shuffle
+from modules.track import Track
+from modules.track_pool import TrackPool
+
+
+def make_library(size, rng):
+    # a few big franchises and a long tail, like a real anime library
+    animes = [f'Anime {int(rng.paretovariate(1.2))}' for _ in range(size)]
+    return {f'{index:07d}.mp3': Track(f'Artist {rng.randrange(size // 20 + 1)}', f'Song {index}', anime)
+            for index, anime in enumerate(animes)}
+
+
+def spacing_violations(order, library, spacing):
+    last_seen = {}
+    violations = 0
+    for step, track in enumerate(order):
+        anime = library[track].anime
+        if anime in last_seen and step - last_seen[anime] <= spacing:
+            violations += 1
+        last_seen[anime] = step
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser('Cost of building and walking the shuffle order')
+    parser.add_argument('--plays', type=int, default=1000, help='number of next calls measured per library size')
+    parser.add_argument('--spacing', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"tracks":>10} {"build ms":>10} {"us/next":>10} {"random violations":>18} {"spaced violations":>18}')
+    for size in (1_000, 10_000, 100_000):
+        library = make_library(size, random.Random(args.seed))
+        pool = TrackPool(library)
+        shuffle = Shuffle(pool, library, args.seed, args.spacing, weight_column='anime')
+        start = time.perf_counter()
+        shuffle.next()
+        build = time.perf_counter() - start
+        plays = min(args.plays, size // 10)
+        used = []
+        start = time.perf_counter()
+        for _ in range(plays):
+            track = shuffle.next(used)
+            pool.remove(track)
+            used.append(track)
+        per_next = (time.perf_counter() - start) / plays
+        rng = random.Random(args.seed)
+        random_order = rng.sample(list(library), plays)
+        print(f'{size:>10} {build * 1000:>10.1f} {per_next * 1e6:>10.2f} '
+              f'{spacing_violations(random_order, library, args.spacing):>18} '
+              f'{spacing_violations(used, library, args.spacing):>18}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QCoreApplication, QTimer
+
+from modules.stop_watch import StopWatch
+
+
+class TickCountingStopWatch:
+    # the previous implementation: decrement an integer on every 1000 ms tick
+    def __init__(self, timeout):
+        self._secret_timer = QTimer()
+        self.time = timeout
+        self._timeout_fun = lambda: None
+        self._secret_timer.timeout.connect(self._tick)
+
+    def start(self):
+        self._secret_timer.start(1000)
+
+    def stop(self):
+        self._secret_timer.stop()
+
+    def connect_timeout_fun(self, fun):
+        self._timeout_fun = fun
+
+    def _tick(self):
+        self.time = self.time - 1
+        if self.time == 0:
+            self._timeout_fun()
+            self._secret_timer.stop()
+
+
+def measure(app, stop_watch, timeout, busy_ms, pauses, rng):
+    result = {}
+    busy = QTimer()
+    busy.timeout.connect(lambda: time.sleep(rng.uniform(0, busy_ms) / 1000))
+    busy.start(0)
+    paused_for = 0.0
+
+    def pause_and_resume():
+        nonlocal paused_for
+        stop_watch.stop()
+        pause = rng.uniform(0.2, 0.7)
+        time.sleep(pause)
+        paused_for += pause
+        stop_watch.start()
+
+    for index in range(pauses):
+        QTimer.singleShot(int((index + 0.5) * timeout * 1000 / (pauses + 1)), pause_and_resume)
+
+    def finished():
+        result['elapsed'] = time.monotonic() - started - paused_for
+        busy.stop()
+        app.quit()
+
+    stop_watch.connect_timeout_fun(finished)
+    started = time.monotonic()
+    stop_watch.start()
+    app.exec()
+    return result['elapsed'] - timeout
+
+
+def main():
+    parser = argparse.ArgumentParser('StopWatch drift under a busy event loop')
+    parser.add_argument('--timeout', type=int, default=5)
+    parser.add_argument('--busy-ms', type=float, default=150.0, help='upper bound of each simulated blocking task')
+    parser.add_argument('--pauses', type=int, default=3, help='pause/resume cycles during the countdown')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    app = QCoreApplication([])
+    for name, factory in (('tick counting', TickCountingStopWatch), ('monotonic deadline', StopWatch)):
+        drift = measure(app, factory(args.timeout), args.timeout, args.busy_ms, args.pauses, random.Random(args.seed))
+        print(f'{name:>20}: drift {drift * 1000:+8.1f} ms over {args.timeout} s with {args.pauses} pauses')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import random
+import time
+
+from modules.track_pool import TrackPool
+
+
+def play_round(pool, used, plays, rng):
+    # mirrors Player.next followed by Player.play_from for a freshly drawn track
+    start = time.perf_counter()
+    for _ in range(plays):
+        track = rng.choice(pool) if isinstance(pool, list) else pool.choice(rng)
+        if track in pool:
+            pool.remove(track)
+            used.append(track)
+    return (time.perf_counter() - start) / plays
+
+
+def main():
+    parser = argparse.ArgumentParser('Per-play cost of the track pool')
+    parser.add_argument('--plays', type=int, default=1000, help='number of plays measured per library size')
+    parser.add_argument('--list-limit', type=int, default=100_000,
+                        help='largest library size measured with the old list-based pool')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"tracks":>10} {"pool us/play":>14} {"list us/play":>14}')
+    for size in (1_000, 10_000, 100_000, 1_000_000):
+        tracks = [f'{index:07d}.mp3' for index in range(size)]
+        pool_cost = play_round(TrackPool(tracks), [], args.plays, random.Random(args.seed))
+        list_cost = play_round(list(tracks), [], args.plays, random.Random(args.seed)) \
+            if size <= args.list_limit else float('nan')
+        print(f'{size:>10} {pool_cost * 1e6:>14.2f} {list_cost * 1e6:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QCoreApplication
+
+from benchmarks.synthetic import make_library
+from modules.library import LibraryHandler
+from modules.metadata_cache import CACHE_FILENAME
+
+
+def timed(fun, repeat=1):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_library(directory, workers):
+    results = {}
+    cache = os.path.join(directory, CACHE_FILENAME)
+    for source, library_filename in (('csv', '_library.csv'), ('tags', '_missing.csv')):
+        if os.path.exists(cache):
+            os.remove(cache)
+        results[f'init_{source}_cold'], _ = timed(lambda: LibraryHandler(directory, library_filename,
+                                                                         workers=workers))
+        results[f'init_{source}_warm'], _ = timed(lambda: LibraryHandler(directory, library_filename,
+                                                                         workers=workers), repeat=3)
+    return results
+
+
+def bench_player(directory, plays):
+    try:
+        from modules.player import Player
+    except ImportError as error:
+        logging.warning(f'PLAYER BENCHMARKS SKIPPED: {error}')
+        return {}
+    handler = LibraryHandler(directory)
+    player = Player(handler.audio_files, handler.used, directory, handler.durations, handler.start_offsets)
+    plays = min(plays, len(handler.audio_files))
+
+    def play_loop():
+        for _ in range(plays):
+            player.next()
+            player.play_from(0.0)
+
+    elapsed, _ = timed(play_loop)
+    return {'next_play_from_per_call': elapsed / plays}
+
+
+def bench_used(directory, plays):
+    results = {}
+    for mode, journal in (('rewrite', False), ('journal', True)):
+        handler = LibraryHandler(directory, journal=journal)
+        pool = list(handler.audio_files)[:plays]
+
+        def write_loop():
+            for track in pool:
+                handler.used.append(track)
+                handler.write_used()
+
+        elapsed, _ = timed(write_loop)
+        results[f'write_used_{mode}_per_call'] = elapsed / len(pool)
+        elapsed, _ = timed(handler.close)
+        results[f'write_used_{mode}_close'] = elapsed
+    return results
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser('Headless benchmarks of library loading, track selection and persistence')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000],
+                        help='library sizes to generate (100000 takes a while and ~200 MB of disk)')
+    parser.add_argument('--plays', type=int, default=500, help='number of Next/Play and used writes per size')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', help='JSON file to write results to (default: stdout)')
+    parser.add_argument('--keep', action='store_true', default=False, help='keep generated libraries')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARN)
+    app = QCoreApplication([])
+    report = {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'workers': args.workers,
+        'results': {},
+    }
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix=f'oped_bench_{size}_')
+        try:
+            generation, _ = timed(lambda: make_library(directory, size))
+            results = {'generate': generation}
+            results.update(bench_library(directory, args.workers))
+            results.update(bench_player(directory, args.plays))
+            results.update(bench_used(directory, args.plays))
+            report['results'][str(size)] = results
+            print(f'{size}: done', file=sys.stderr)
+        finally:
+            if args.keep:
+                print(f'{size}: kept {directory}', file=sys.stderr)
+            else:
+                shutil.rmtree(directory)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as outputfile:
+            outputfile.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import csv
+import os
+import random
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 byte frames
+MP3_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+
+def _text_frame(frame_id, text):
+    data = b'\x03' + text.encode('utf-8')
+    return frame_id + len(data).to_bytes(4, 'big') + b'\x00\x00' + data
+
+
+def _syncsafe(size):
+    return bytes(((size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F))
+
+
+def fake_mp3(artist, title, anime, frames=4):
+    tag = _text_frame(b'TPE1', artist) + _text_frame(b'TIT2', title) + _text_frame(b'TALB', anime)
+    return b'ID3\x03\x00\x00' + _syncsafe(len(tag)) + tag + MP3_FRAME * frames
+
+
+def track_name(index):
+    return f'{index:06d}.mp3'
+
+
+def make_library(directory, size, used_fraction=0.1, seed=0, library_filename='_library.csv'):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    rows = []
+    for index in range(size):
+        row = (track_name(index), f'Artist {rng.randrange(size // 20 + 1)}', f'Song {index}',
+               f'Anime {rng.randrange(size // 4 + 1)}')
+        with open(os.path.join(directory, row[0]), 'wb') as audiofile:
+            audiofile.write(fake_mp3(*row[1:]))
+        rows.append(row)
+    with open(os.path.join(directory, library_filename), 'w', encoding='utf-8', newline='') as libraryfile:
+        writer = csv.writer(libraryfile)
+        writer.writerow(('filename', 'artist', 'title', 'anime'))
+        writer.writerows(rows)
+    used = rng.sample([row[0] for row in rows], int(size * used_fraction))
+    with open(os.path.join(directory, '_used.txt'), 'w', encoding='utf-8') as usedfile:
+        usedfile.write('\n'.join(used))
+    return rows
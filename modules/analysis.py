@@ -0,0 +1,119 @@
+import logging
+import os
+import shutil
+import subprocess
+import wave
+from functools import partial
+
+import numpy as np
+
+from modules.metadata_cache import cached_refresh_batches
+
+DECODE_SAMPLE_RATE = 11025
+FRAME_SECONDS = 0.05
+PROBE_SECONDS = 10.0
+STEP_SECONDS = 1.0
+MAX_OFFSETS = 16
+SILENCE_DB = -45.0
+LEVEL_TOLERANCE_DB = 6.0
+MAX_FADE_DB = 3.0
+MAX_SILENT_FRACTION = 0.05
+MIN_ONSET_RATIO = 0.5
+
+
+def ffmpeg_decoder(path, sample_rate=DECODE_SAMPLE_RATE):
+    output = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', path, '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-'],
+        stdout=subprocess.PIPE, check=True
+    ).stdout
+    return np.frombuffer(output, dtype='<i2').astype(np.float32) / 32768, sample_rate
+
+
+def wave_decoder(path):
+    with wave.open(path, 'rb') as wavefile:
+        channels, width, sample_rate = wavefile.getnchannels(), wavefile.getsampwidth(), wavefile.getframerate()
+        data = wavefile.readframes(wavefile.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    else:
+        samples = np.frombuffer(data, dtype={2: '<i2', 4: '<i4'}[width]).astype(np.float32) / (1 << (8 * width - 1))
+    return samples.reshape(-1, channels).mean(axis=1), sample_rate
+
+
+def default_decoder(path):
+    if path.lower().endswith('.wav'):
+        return wave_decoder(path)
+    return ffmpeg_decoder(path)
+
+
+def _window_means(values, window):
+    sums = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def find_start_offsets(samples, sample_rate):
+    frame = int(sample_rate * FRAME_SECONDS)
+    probe = int(PROBE_SECONDS / FRAME_SECONDS)
+    count = len(samples) // frame
+    if count <= probe:
+        return ()
+    frames = samples[:count * frame].reshape(count, frame)
+    level = 20 * np.log10(np.sqrt(np.mean(np.square(frames), axis=1)) + 1e-9)
+    silent = level < SILENCE_DB
+    if silent.all():
+        return ()
+    onset = np.maximum(np.diff(level, prepend=level[0]), 0)
+
+    mean_level = _window_means(level, probe)
+    half_level = _window_means(level, probe // 2)
+    fade = half_level[:len(mean_level)] - half_level[probe // 2:probe // 2 + len(mean_level)]
+    silent_fraction = _window_means(silent, probe)
+    onset_strength = _window_means(onset, probe)
+    good = (mean_level >= np.median(level[~silent]) - LEVEL_TOLERANCE_DB) \
+        & (fade <= MAX_FADE_DB) \
+        & (silent_fraction <= MAX_SILENT_FRACTION) \
+        & (onset_strength >= MIN_ONSET_RATIO * np.median(onset_strength))
+
+    step = int(STEP_SECONDS / FRAME_SECONDS)
+    candidates = np.flatnonzero(good[::step]) * step
+    if len(candidates) > MAX_OFFSETS:
+        candidates = candidates[np.linspace(0, len(candidates) - 1, MAX_OFFSETS).astype(int)]
+    return tuple(int(candidate * FRAME_SECONDS * 1000) for candidate in candidates)
+
+
+def analyse_track(path, decoder=default_decoder):
+    try:
+        samples, sample_rate = decoder(path)
+    except (OSError, EOFError, ValueError, wave.Error, subprocess.CalledProcessError) as error:
+        logging.warning(f'ANALYSIS FAILED FOR {path}: {error}')
+        return None
+    return find_start_offsets(samples, sample_rate)
+
+
+def map_tracks(directory, names, analyse, pool):
+    return pool.map(analyse, [os.path.join(directory, name) for name in names])
+
+
+def cached_analysis_batches(directory, names, table, columns, compute, pool, needs_ffmpeg=True, batch_size=64):
+    complete = not needs_ffmpeg or shutil.which('ffmpeg') is not None
+    if not complete:
+        logging.warning(f'FFMPEG NOT FOUND: {table.upper()} ANALYSIS OF WAV FILES ONLY')
+        names = [name for name in names if name.lower().endswith('.wav')]
+    # without ffmpeg most of the library is skipped, so its cached results are kept
+    yield from cached_refresh_batches(directory, table, columns, names, compute, pool, batch_size, prune=complete)
+
+
+def analyse_tracks(directory, names, pool, decoder=default_decoder):
+    offsets = map_tracks(directory, names, partial(analyse_track, decoder=decoder), pool)
+    return [(None if entry is None else ','.join(map(str, entry)),) for entry in offsets]
+
+
+def parse_offsets(text):
+    return tuple(int(offset) for offset in text.split(',') if offset) if text is not None else None
+
+
+def start_offset_batches(directory, names, pool, decoder=default_decoder, batch_size=64):
+    for batch in cached_analysis_batches(directory, names, 'start_offsets', ['offsets TEXT'],
+                                         partial(analyse_tracks, decoder=decoder), pool,
+                                         decoder is default_decoder, batch_size):
+        yield {name: parse_offsets(entry[0]) for name, entry in batch}
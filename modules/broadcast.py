@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import struct
+import threading
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+HANDSHAKE_TIMEOUT = 0.2
+MAX_BUFFER = 256 * 1024
+OPCODE_CLOSE = 0x8
+
+
+def websocket_frame(payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x81, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x81, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, length)
+    return header + payload
+
+
+async def _read_websocket_frame(reader):
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    await reader.readexactly(length + (4 if second & 0x80 else 0))
+    return first & 0x0F
+
+
+class BroadcastServer:
+    # clients get {"seq": n, "state": {...}} on connect and {"seq": n, "diff": {...}} for every change, one JSON
+    # document per line over raw TCP or per text frame over WebSocket
+    def __init__(self, host='0.0.0.0', port=8765, max_buffer=MAX_BUFFER):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.state = {}
+        self._sequence = 0
+        self._clients = {}
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._error = None
+        self._ready = threading.Event()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='broadcast', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        logging.info(f'BROADCASTING ON {self.host}:{self.port}')
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def update(self, **state):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._apply, state)
+
+    def _run(self):
+        self._loop = loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+        except OSError as error:
+            self._error = error
+            self._loop = None
+            loop.close()
+            self._ready.set()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        loop.run_forever()
+        self._server.close()
+        for writer in self._clients:
+            writer.transport.abort()
+        self._clients.clear()
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, self._server.wait_closed(), return_exceptions=True))
+        loop.close()
+
+    def _apply(self, state):
+        diff = {key: value for key, value in state.items() if self.state.get(key) != value}
+        if not diff:
+            return
+        self.state.update(diff)
+        self._sequence += 1
+        self._send_all({'seq': self._sequence, 'diff': diff})
+
+    def _send_all(self, message):
+        # encoded once and written without awaiting, so one slow screen never delays the others
+        line = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        payloads = {False: line + b'\n', True: websocket_frame(line)}
+        for writer, websocket in list(self._clients.items()):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                logging.warning(f'BROADCAST CLIENT TOO SLOW, DROPPED: {writer.get_extra_info("peername")}')
+                writer.transport.abort()
+                del self._clients[writer]
+                continue
+            writer.write(payloads[websocket])
+
+    async def _handshake(self, reader, writer):
+        try:
+            first_line = await asyncio.wait_for(reader.readline(), HANDSHAKE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        if not first_line.startswith(b'GET '):
+            return False
+        key = None
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'sec-websocket-key':
+                key = value.strip().encode('latin-1')
+        if key is None:
+            raise ConnectionError('missing Sec-WebSocket-Key')
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        return True
+
+    async def _serve(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        try:
+            websocket = await self._handshake(reader, writer)
+            snapshot = json.dumps({'seq': self._sequence, 'state': self.state}, separators=(',', ':')).encode('utf-8')
+            writer.write(websocket_frame(snapshot) if websocket else snapshot + b'\n')
+            self._clients[writer] = websocket
+            logging.debug(f'BROADCAST CLIENT CONNECTED: {peer}, {len(self._clients)} TOTAL')
+            if websocket:
+                while await _read_websocket_frame(reader) != OPCODE_CLOSE:
+                    pass
+            else:
+                while await reader.read(1024):
+                    pass
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            logging.debug(f'BROADCAST CLIENT FAILED {peer}: {error}')
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.metadata import index_frames
+from modules.metadata_cache import FileCache
+
+CLIPS_DIRECTORY = '.clips'
+INDEX_COLUMNS = ['sample_rate INTEGER', 'samples INTEGER', 'offsets BLOB']
+# layer III frames borrow bits from the frames before them, so a clip starts a little early and is seeked into
+PRE_ROLL_FRAMES = 2
+
+
+class ClipCache:
+    def __init__(self, directory, max_bytes):
+        self.max_bytes = max_bytes
+        # one thread owns the sqlite connection and indexes tracks ahead of the play button
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._indexes = {}
+        self._index_cache = None
+        self._clips = OrderedDict()
+        self._size = 0
+        self.renew(directory)
+
+    def renew(self, directory):
+        self._executor.submit(self._close_index_cache).result()
+        self.directory = directory
+        self.clips_directory = os.path.join(directory, CLIPS_DIRECTORY)
+        self._indexes = {}
+        self._clips = OrderedDict()
+        self._size = 0
+        try:
+            entries = sorted((entry for entry in os.scandir(self.clips_directory) if entry.name.endswith('.mp3')),
+                             key=lambda entry: entry.stat().st_mtime_ns)
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            self._clips[entry.name] = entry.stat().st_size
+            self._size += self._clips[entry.name]
+        logging.info(f'CLIP CACHE: {len(self._clips)} CLIPS, {self._size / (1 << 20):.1f} MB '
+                     f'IN {self.clips_directory}')
+        self._evict()
+        return self
+
+    def close(self):
+        self._executor.submit(self._close_index_cache).result()
+        self._executor.shutdown()
+
+    def prefetch(self, name):
+        if name is not None and name.lower().endswith('.mp3') and name not in self._indexes:
+            self._indexes[name] = self._executor.submit(self._index, name)
+
+    def clip(self, name, start, length):
+        self.prefetch(name)
+        future = self._indexes.get(name)
+        # Play never waits for an index: until prefetch has built it, the pre-warmed full track plays instead
+        if future is None or not future.done():
+            logging.debug(f'FRAME INDEX NOT READY: {name}')
+            return None
+        index = future.result()
+        if index is None:
+            return None
+        stat, sample_rate, samples, offsets = index
+        frame_seconds = samples / sample_rate
+        target = max(0, min(int(start / frame_seconds), len(offsets) - 2))
+        first = max(0, target - PRE_ROLL_FRAMES)
+        last = min(len(offsets) - 1, target + int(length / frame_seconds) + 1)
+        key = hashlib.sha1(f'{name}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode()).hexdigest()[:16]
+        filename = f'{key}_{first}_{last}.mp3'
+        path = os.path.join(self.clips_directory, filename)
+        lead_in = int((start - first * frame_seconds) * 1000)
+        if filename in self._clips:
+            self._clips.move_to_end(filename)
+            try:
+                os.utime(path)
+                return path, lead_in
+            except OSError:
+                self._size -= self._clips.pop(filename)
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as audiofile:
+                audiofile.seek(offsets[first])
+                data = audiofile.read(offsets[last] - offsets[first])
+            os.makedirs(self.clips_directory, exist_ok=True)
+            temporary = path + '.tmp'
+            with open(temporary, 'wb') as clipfile:
+                clipfile.write(data)
+            os.replace(temporary, path)
+        except OSError as error:
+            logging.warning(f'CLIP WRITE FAILED FOR {name}: {error}')
+            return None
+        self._clips[filename] = len(data)
+        self._size += len(data)
+        logging.debug(f'CLIP WRITTEN: {filename} ({len(data)} B)')
+        self._evict()
+        return path, lead_in
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._clips) > 1:
+            filename, size = self._clips.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(os.path.join(self.clips_directory, filename))
+            except OSError as error:
+                logging.warning(f'CLIP EVICTION FAILED FOR {filename}: {error}')
+
+    def _index(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            stat = os.stat(path)
+            cached = self._lookup(name, stat)
+            if cached is not None:
+                sample_rate, samples, blob = cached
+                offsets = array('I')
+                offsets.frombytes(blob)
+            else:
+                sample_rate, samples, offsets = index_frames(path)
+                if self._index_cache is not None:
+                    self._index_cache.store([(name, stat.st_size, stat.st_mtime_ns, sample_rate, samples,
+                                              offsets.tobytes())])
+        except (OSError, ValueError, IndexError) as error:
+            logging.warning(f'FRAME INDEX FAILED FOR {name}: {error}')
+            return None
+        if len(offsets) < 2:
+            return None
+        return stat, sample_rate, samples, offsets
+
+    def _lookup(self, name, stat):
+        try:
+            if self._index_cache is None:
+                self._index_cache = FileCache(self.directory, 'frame_index', INDEX_COLUMNS)
+            return self._index_cache.lookup(name, stat.st_size, stat.st_mtime_ns)
+        except sqlite3.Error as error:
+            logging.warning(f'FRAME_INDEX CACHE UNAVAILABLE ({error}): indexing without cache')
+            return None
+
+    def _close_index_cache(self):
+        if self._index_cache is not None:
+            self._index_cache.close()
+            self._index_cache = None
@@ -1,28 +1,52 @@
 import logging
-import math
 import os
+import statistics
 
 from PyQt6.QtCore import QSize, QTimer, Qt, QDir
 from PyQt6.QtGui import QIcon, QCloseEvent, QIntValidator
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QGroupBox, QHBoxLayout, QCheckBox, QLineEdit, QSizePolicy, QLabel, \
-    QPushButton, QButtonGroup, QMenu, QMenuBar, QFileDialog
+    QPushButton, QButtonGroup, QMenu, QMenuBar, QFileDialog, QProgressBar
 
 from modules.helper import HelperWindow
+from modules.profiler import profiled
+from modules.library import LibraryHandler
+from modules.dedupe import write_report
+from modules.library_loader import LibraryLoader, LibraryAnalyser, LibraryDeduper, LibraryChangeReader
+from modules.library_watcher import create_library_watcher
+from modules.quiz_state import QuizState
 from modules.stop_watch import StopWatch
 
+# lets the answer keep playing for a moment after the countdown pauses it
+CLIP_MARGIN_SECONDS = 5
+
 
 class ControllerWindow(QWidget):
-    def __init__(self, directory, player, library_handler, do_not_write_used):
+    def __init__(self, directory, player, library_handler, do_not_write_used, analyse=False, watch=False,
+                 broadcaster=None, dedupe=False, normalise=False):
         super().__init__()
         self.directory = directory
         self.setWindowTitle("Shami")
         self.setWindowIcon(QIcon(os.path.join(os.path.dirname(__file__), '..', 'resources', 'icons', 'shami.png')))
 
         self.no_used = do_not_write_used
-
+        self.analyse = analyse
+        self.watch = watch
+        self.broadcaster = broadcaster
+        self.dedupe = dedupe
+        self.normalise = normalise
+
+        # widgets are repainted from the state once per event loop cycle, with only the fields that changed
+        self.state = QuizState(lambda flush: QTimer.singleShot(0, flush))
         self.helper_window = HelperWindow(self)
         self.player = player
         self.library_handler = library_handler
+        self._loader = None
+        self._loading_handler = None
+        self._analyser = None
+        self._watcher = None
+        self._change_reader = None
+        self._deduper = None
+        self._loudness_analyser = None
 
         self._layout = QVBoxLayout()
         self.menu_bar = self._prepare_menus()
@@ -38,10 +62,21 @@ class ControllerWindow(QWidget):
         self._layout.addWidget(self.button_group)
         self.setLayout(self._layout)
         self.setMinimumSize(800, 600)
+        self.state.subscribe(self._render)
+        self.state.subscribe(self.helper_window.render)
+        self.state.subscribe(self._broadcast)
         self._update_track_counter()
 
     def closeEvent(self, a0: QCloseEvent) -> None:
         self.helper_window.close()
+        self._cancel_loading()
+        self._cancel_analysis()
+        self._cancel_loudness_analysis()
+        self._stop_watching()
+        self._stop_dedupe()
+        self.library_handler.close()
+        if self.player.clips is not None:
+            self.player.clips.close()
         return super(ControllerWindow, self).closeEvent(a0)
 
     def minimumSizeHint(self):
@@ -52,6 +87,8 @@ class ControllerWindow(QWidget):
         self.menu = QMenu("Menu")
 
         self.menu.addAction("Open", self._open_directory)
+        self.cancel_load_action = self.menu.addAction("Cancel loading", self._cancel_loading)
+        self.cancel_load_action.setEnabled(False)
         self.menu.addSeparator()
         self.menu.addAction("Exit", self.close)
 
@@ -63,11 +100,214 @@ class ControllerWindow(QWidget):
         dialog.setFileMode(QFileDialog.FileMode.Directory)
         path = dialog.getExistingDirectory()
         if path:
-            self.directory = path
-            self.library_handler.__init__(path)
-            self.player.__init__(self.library_handler.audio_files, self.library_handler.used, self.directory)
+            self._cancel_loading()
+            self.load_library(LibraryHandler(path, self.library_handler.library_filename, self.library_handler.get_all,
+                                             self.library_handler.workers, self.library_handler.journal,
+                                             self.library_handler.extensions, self.library_handler.room, load=False))
+
+    def load_library(self, library_handler):
+        self._loading_handler = library_handler
+        self._loader = loader = LibraryLoader(library_handler)
+        loader.progress.connect(lambda scanned, total: self._update_load_progress(loader, scanned, total))
+        loader.batch_loaded.connect(
+            lambda library, audio_files, durations: self._add_library_batch(loader, library, audio_files, durations))
+        loader.loaded.connect(lambda cancelled: self._finish_library_load(loader, cancelled))
+        if library_handler is self.library_handler:
+            self.next_button.setEnabled(False)
+        self.load_progress.setRange(0, 0)
+        self.load_progress.show()
+        self.cancel_load_action.setEnabled(True)
+        logging.info(f'LOADING LIBRARY: {library_handler.directory}')
+        loader.start()
+
+    def _update_load_progress(self, loader, scanned, total):
+        if loader is self._loader:
+            # stays a busy indicator until the total is known, a running count as maximum always looks full
+            if total:
+                self.load_progress.setRange(0, total)
+            self.load_progress.setValue(scanned)
+
+    def _add_library_batch(self, loader, library, audio_files, durations):
+        if loader is not self._loader:
+            return
+        self._loading_handler.extend(library, audio_files, durations)
+        if self._loading_handler is self.library_handler:
+            self.next_button.setEnabled(len(self.player.audio_files) > 0)
             self._update_track_counter()
 
+    def _finish_library_load(self, loader, cancelled):
+        if loader is not self._loader:
+            return
+        handler = self._loading_handler
+        self._loader = None
+        self._loading_handler = None
+        self.load_progress.hide()
+        self.cancel_load_action.setEnabled(False)
+        self.next_button.setEnabled(True)
+        if handler is self.library_handler:
+            history_size = handler.finish_loading(complete=not cancelled)
+            self.player.index += history_size
+            if not self.no_used and len(handler.used) > history_size:
+                handler.write_used()
+        elif cancelled:
+            logging.info(f'LIBRARY LOADING CANCELLED: {handler.directory}')
+            return
+        else:
+            handler.finish_loading()
+            self._cancel_analysis()
+            self._cancel_loudness_analysis()
+            self._stop_watching()
+            self._stop_dedupe()
+            self.library_handler.close()
+            self.library_handler = handler
+            self.directory = handler.directory
+            self.player.__init__(handler.audio_files, handler.used, self.directory, handler.durations,
+                                 handler.start_offsets, self.player.skip_start, self.player.skip_end,
+                                 self.player.shuffle.renew(handler.audio_files, handler), handler.session,
+                                 self.player.clips.renew(self.directory) if self.player.clips is not None else None,
+                                 handler.loudness)
+        self._update_track_counter()
+        self._apply_search()
+        if cancelled:
+            # background jobs over a partial library would prune the caches of every file not scanned yet
+            return
+        if self.analyse:
+            self._start_analysis(handler)
+        if self.watch:
+            self._start_watching(handler)
+        if self.normalise:
+            self._start_loudness_analysis(handler)
+        if self.dedupe:
+            self._start_dedupe(handler)
+
+    def _start_dedupe(self, library_handler):
+        self._deduper = deduper = LibraryDeduper(library_handler.directory, sorted(library_handler.files),
+                                                 library_handler.workers)
+        deduper.deduplicated.connect(lambda groups: self._collapse_duplicates(deduper, library_handler, groups))
+        deduper.start()
+
+    def _collapse_duplicates(self, deduper, library_handler, groups):
+        if deduper is not self._deduper or library_handler is not self.library_handler:
+            return
+        self._deduper = None
+        removed_positions, merged = library_handler.collapse_duplicates(groups)
+        self.player.library_changed(removed_positions)
+        self._update_track_counter()
+        if merged:
+            try:
+                write_report(library_handler.directory, merged)
+            except OSError as error:
+                logging.warning(f'DUPLICATE REPORT NOT WRITTEN: {error}')
+
+    def _start_watching(self, library_handler):
+        self._watcher = watcher = create_library_watcher(library_handler.directory, library_handler.library_filename,
+                                                         library_handler.extensions)
+        # tags of new files are read on the reader thread, the GUI thread only applies the results
+        self._change_reader = reader = LibraryChangeReader(library_handler)
+        watcher.changed.connect(reader.submit)
+        reader.read.connect(lambda touched, removed, track_infos, library:
+                            self._apply_library_changes(reader, touched, removed, track_infos, library))
+        reader.start()
+        watcher.start()
+
+    def _apply_library_changes(self, reader, touched, removed, track_infos, library):
+        if reader is not self._change_reader:
+            return
+        removed_positions = self.library_handler.apply_changes(touched, removed, track_infos, library)
+        self.player.library_changed(removed_positions)
+        self._update_track_counter()
+        if self.search_input.text():
+            self._apply_search()
+
+    @profiled('controller.apply_search')
+    def _apply_search(self):
+        matches = self.library_handler.metadata_index.query(self.search_input.text())
+        self.player.set_filter(matches)
+        if matches is None:
+            self.search_result.setText("")
+        else:
+            remaining = sum(1 for track in matches if track in self.player.audio_files)
+            self.search_result.setText(f"{remaining} matching")
+            logging.info(f'FILTER "{self.search_input.text()}": {len(matches)} MATCHES, {remaining} NOT PLAYED')
+
+    def _stop_dedupe(self):
+        deduper = self._deduper
+        if deduper is not None:
+            self._deduper = None
+            deduper.cancel()
+            deduper.wait()
+
+    def _stop_watching(self):
+        watcher = self._watcher
+        if watcher is not None:
+            watcher.stop()
+            self._watcher = None
+        reader = self._change_reader
+        if reader is not None:
+            self._change_reader = None
+            reader.stop()
+
+    def _start_analysis(self, library_handler):
+        # numpy is only imported once an analysis is asked for
+        from modules.analysis import start_offset_batches
+        self._analyser = analyser = LibraryAnalyser(library_handler.directory, library_handler.known_audio_files(),
+                                                    start_offset_batches, library_handler.workers)
+        analyser.batch_analysed.connect(
+            lambda start_offsets: self._add_start_offsets(analyser, library_handler, start_offsets))
+        analyser.finished.connect(lambda: logging.info(f'LIBRARY ANALYSIS FINISHED: {library_handler.directory}'))
+        analyser.start()
+
+    def _add_start_offsets(self, analyser, library_handler, start_offsets):
+        if analyser is self._analyser:
+            library_handler.start_offsets.update(start_offsets)
+
+    def _start_loudness_analysis(self, library_handler):
+        from modules.loudness import loudness_batches
+        self._loudness_analyser = analyser = LibraryAnalyser(library_handler.directory,
+                                                             library_handler.known_audio_files(), loudness_batches,
+                                                             library_handler.workers)
+        analyser.batch_analysed.connect(lambda loudness: self._add_loudness(analyser, library_handler, loudness))
+        analyser.finished.connect(lambda: self._finish_loudness_analysis(analyser, library_handler))
+        analyser.start()
+
+    def _add_loudness(self, analyser, library_handler, loudness):
+        if analyser is not self._loudness_analyser:
+            return
+        library_handler.loudness.update((name, lufs) for name, lufs in loudness.items() if lufs is not None)
+        if self.player.fallback_loudness is None and library_handler.loudness:
+            self.player.fallback_loudness = statistics.median(library_handler.loudness.values())
+
+    def _finish_loudness_analysis(self, analyser, library_handler):
+        if analyser is not self._loudness_analyser:
+            return
+        self._loudness_analyser = None
+        # tracks that could not be measured play at the level of a typical track
+        if library_handler.loudness:
+            self.player.fallback_loudness = statistics.median(library_handler.loudness.values())
+        logging.info(f'LOUDNESS ANALYSIS FINISHED: {len(library_handler.loudness)} TRACKS, '
+                     f'FALLBACK {self.player.fallback_loudness} LUFS')
+
+    def _cancel_loudness_analysis(self):
+        analyser = self._loudness_analyser
+        if analyser is not None:
+            self._loudness_analyser = None
+            analyser.cancel()
+            analyser.wait()
+
+    def _cancel_analysis(self):
+        analyser = self._analyser
+        if analyser is not None:
+            analyser.cancel()
+            analyser.wait()
+            self._analyser = None
+
+    def _cancel_loading(self):
+        loader = self._loader
+        if loader is not None:
+            loader.cancel()
+            loader.wait()
+            self._finish_library_load(loader, True)
+
     def _prepare_helper_windows_group(self):
         group = QGroupBox("Helper Window")
         box = QHBoxLayout()
@@ -110,19 +350,9 @@ class ControllerWindow(QWidget):
 
     def _change_helper_font_size(self, size_string):
         if size_string.strip() != '':
-            self._change_label_font_size(self.helper_window.title_label, size_string)
-            self._change_label_font_size(self.helper_window.artist_label, size_string)
-            self._change_label_font_size(self.helper_window.artist_label, size_string)
-            self._change_label_font_size(self.helper_window.track_label, size_string)
-            self._change_label_font_size(self.helper_window.time_label, size_string)
-            self._change_label_font_size(self.helper_window.track_count_label, size_string, 2)
+            self.state.update(font_size=int(size_string))
             logging.debug(f'HELPER FONT SIZE CHANGED TO: {size_string}')
 
-    def _change_label_font_size(self, label, size_string, div_modifier=1):
-        font = label.font()
-        font.setPointSize(math.ceil(int(size_string) / div_modifier))
-        label.setFont(font)
-
     def _prepare_infobox(self):
         group = QGroupBox("Info")
         box = QVBoxLayout()
@@ -138,6 +368,22 @@ class ControllerWindow(QWidget):
         box.addWidget(self.title_label, stretch=2, alignment=Qt.AlignmentFlag.AlignCenter)
         box.addWidget(self.artist_label, stretch=2, alignment=Qt.AlignmentFlag.AlignCenter)
         box.addWidget(self.track_label, stretch=2, alignment=Qt.AlignmentFlag.AlignCenter)
+        self.load_progress = QProgressBar()
+        self.load_progress.setFormat("Loading library: %v files")
+        self.load_progress.hide()
+        box.addWidget(self.load_progress)
+        search_box = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Filter tracks, e.g. gundam or artist:aimer")
+        self.search_input.textChanged.connect(lambda _: self._search_timer.start())
+        self._search_timer = QTimer()
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(200)
+        self._search_timer.timeout.connect(self._apply_search)
+        self.search_result = QLabel("")
+        search_box.addWidget(self.search_input)
+        search_box.addWidget(self.search_result)
+        box.addLayout(search_box)
         group.setLayout(box)
         return group
 
@@ -178,17 +424,12 @@ class ControllerWindow(QWidget):
     def _final_timer_event(self):
         self.player.pause()
 
+    @profiled('controller.tick_timer_event')
     def _tick_timer_event(self):
-        self.time_label.setText(f'Countdown: {self.timer.time}')
-        self.helper_window.time_label.setText(f'{self.timer.time}')
+        self.state.update(time=self.timer.time, counting=True)
 
     def _reset_time_label(self):
-        self.time_label.setText('Countdown: ')
-        if self.window_check.isChecked():
-            self._reset_helper_time_label()
-
-    def _reset_helper_time_label(self):
-        self.helper_window.time_label.setText(f'{self.timer.time}')
+        self.state.update(time=self.timer.time, counting=False)
 
     def _prepare_buttons(self):
         group = QGroupBox("Controls")
@@ -214,28 +455,27 @@ class ControllerWindow(QWidget):
         group.setLayout(box)
         return group
 
+    @profiled('controller.play')
     def _play(self):
-        if not self.no_used:
-            self.library_handler.write_used()
+        while not self.no_used and not self.player.claim():
+            if self._next() is None:
+                return
         self.timer.reset()
         self.timer.start()
+        self.player.clip_length = self.timer.time + CLIP_MARGIN_SECONDS if self.timer.time > 0 else 0
         if self.random_sample_checkbox.isChecked():
             self.player.play_random()
         else:
             self.player.play_from(0.0)
+        if not self.no_used:
+            self.library_handler.write_used()
 
+    @profiled('controller.get_and_set_track_info')
     def _get_and_set_track_info(self, track):
         track_info = self.library_handler[track]
         logging.debug(f"TRACK INFO: {track_info}")
-        self.filename.setText(track)
-        self.title_label.setText(track_info['anime'])
-        self.artist_label.setText(track_info['artist'])
-        self.track_label.setText(track_info['title'])
-
-    def _set_track_info_helper(self, title, artist, track):
-        self.helper_window.title_label.setText(title)
-        self.helper_window.artist_label.setText(artist)
-        self.helper_window.track_label.setText(track)
+        self.state.update(filename=track, anime=track_info['anime'], artist=track_info['artist'],
+                          title=track_info['title'])
 
     def _set_track(self, track):
         logging.debug(f"TRACK: {track}")
@@ -243,10 +483,39 @@ class ControllerWindow(QWidget):
 
     def _update_track_counter(self):
         index, total = self.player.get_index_and_total()
-        self.song_counter.setText(f"{index + 1}/{total}")
-        if self.window_check.isChecked():
-            self.helper_window.track_count_label.setText(f"{index + 1}/{total}")
-
+        self.state.update(count=f"{index + 1}/{total}")
+
+    @profiled('controller.render')
+    def _render(self, state, changed):
+        if 'count' in changed:
+            self.song_counter.setText(state['count'])
+        if 'filename' in changed:
+            self.filename.setText(state['filename'])
+        if 'anime' in changed:
+            self.title_label.setText(state['anime'])
+        if 'artist' in changed:
+            self.artist_label.setText(state['artist'])
+        if 'title' in changed:
+            self.track_label.setText(state['title'])
+        if not changed.isdisjoint(('time', 'counting')):
+            self.time_label.setText(f'Countdown: {state["time"]}' if state['counting'] else 'Countdown: ')
+
+    def _broadcast(self, state, changed):
+        if self.broadcaster is None:
+            return
+        update = {}
+        if 'count' in changed:
+            update['count'] = state['count']
+        if 'time' in changed:
+            update['time'] = state['time']
+        # remote screens show what the helper window shows, never the unrevealed answer
+        for field, key in (('anime', 'title'), ('artist', 'artist'), ('title', 'track')):
+            if not changed.isdisjoint((field, f'show_{field}')):
+                update[key] = state.revealed(field)
+        if update:
+            self.broadcaster.update(**update)
+
+    @profiled('controller.next')
     def _next(self):
         self.reset_helper()
         track = self.player.next()
@@ -256,7 +525,9 @@ class ControllerWindow(QWidget):
             self._set_track(track)
             self._get_and_set_track_info(track)
             self._update_track_counter()
+        return track
 
+    @profiled('controller.prev')
     def _prev(self):
         self.reset_helper()
         track = self.player.previous()
@@ -287,9 +558,7 @@ class ControllerWindow(QWidget):
             self.track_check.setEnabled(True)
             self.helper_font_size.setEnabled(True)
             self.show_all_button.setEnabled(True)
-            self._set_track_info_helper("", "", "")
-            self._update_track_counter()
-            self._reset_helper_time_label()
+            self.reset_helper()
             self.helper_window.show()
         else:
             self.title_check.setEnabled(False)
@@ -301,28 +570,13 @@ class ControllerWindow(QWidget):
             self.helper_window.close()
 
     def _show_title(self):
-        if self.title_check.isChecked():
-            self._set_track_info_helper(self.title_label.text(), self.helper_window.artist_label.text(),
-                                        self.helper_window.track_label.text())
-        else:
-            self._set_track_info_helper("", self.helper_window.artist_label.text(),
-                                        self.helper_window.track_label.text())
+        self.state.update(show_anime=self.title_check.isChecked())
 
     def _show_artist(self):
-        if self.artist_check.isChecked():
-            self._set_track_info_helper(self.helper_window.title_label.text(), self.artist_label.text(),
-                                        self.helper_window.track_label.text())
-        else:
-            self._set_track_info_helper(self.helper_window.title_label.text(), "",
-                                        self.helper_window.track_label.text())
+        self.state.update(show_artist=self.artist_check.isChecked())
 
     def _show_track(self):
-        if self.track_check.isChecked():
-            self._set_track_info_helper(self.helper_window.title_label.text(), self.helper_window.artist_label.text(),
-                                        self.track_label.text())
-        else:
-            self._set_track_info_helper(self.helper_window.title_label.text(), self.helper_window.artist_label.text(),
-                                        "")
+        self.state.update(show_title=self.track_check.isChecked())
 
     def _show_all(self):
         self.title_check.setChecked(True)
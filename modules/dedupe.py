@@ -0,0 +1,90 @@
+import csv
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from collections import defaultdict
+
+from modules.metadata import ID3V2_HEADER_SIZE, id3v2_end, mp3_audio_bounds
+from modules.metadata_cache import cached_refresh_batches
+
+REPORT_FILENAME = '_duplicates.csv'
+
+
+def _flac_payload(data):
+    start = id3v2_end(data[:ID3V2_HEADER_SIZE])
+    if data[start:start + 4] != b'fLaC':
+        raise ValueError('missing fLaC marker')
+    position = start + 4
+    while True:
+        header = data[position]
+        position += 4 + int.from_bytes(data[position + 1:position + 4], 'big')
+        if header & 0x80:
+            return position, len(data)
+
+
+def _mp4_payload(data):
+    position = 0
+    while position + 8 <= len(data):
+        size, kind = struct.unpack_from('>I4s', data, position)
+        header_size = 8
+        if size == 1:
+            size, = struct.unpack_from('>Q', data, position + 8)
+            header_size = 16
+        elif size == 0:
+            size = len(data) - position
+        if size < header_size:
+            raise ValueError('invalid MP4 atom size')
+        if kind == b'mdat':
+            return position + header_size, position + size
+        position += size
+    raise ValueError('missing mdat atom')
+
+
+PAYLOADS = {
+    '.mp3': mp3_audio_bounds,
+    '.flac': _flac_payload,
+    '.m4a': _mp4_payload,
+}
+
+
+def content_hash(path):
+    # tags are skipped so re-tagged copies of the same rip hash alike, other formats hash the whole file
+    payload = PAYLOADS.get(os.path.splitext(path)[1].lower())
+    try:
+        with open(path, 'rb') as audiofile:
+            if os.fstat(audiofile.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(audiofile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start, end = payload(data) if payload is not None else (0, len(data))
+                with memoryview(data) as view:
+                    return hashlib.sha256(view[start:end]).hexdigest()
+    except (OSError, ValueError, IndexError, struct.error) as error:
+        logging.warning(f'CONTENT HASH FAILED FOR {path}: {error}')
+        return None
+
+
+def hash_files(directory, names, pool):
+    return [(digest,) for digest in pool.map(content_hash, [os.path.join(directory, name) for name in names])]
+
+
+def find_duplicates(directory, names, pool, batch_size=64):
+    groups = defaultdict(list)
+    for batch in cached_refresh_batches(directory, 'content_hashes', ['digest TEXT'], names, hash_files, pool,
+                                        batch_size):
+        for name, (digest,) in batch:
+            if digest is not None:
+                groups[digest].append(name)
+    duplicates = [sorted(group) for group in groups.values() if len(group) > 1]
+    logging.info(f'FOUND {len(duplicates)} DUPLICATE GROUPS IN {len(names)} FILES')
+    return duplicates
+
+
+def write_report(directory, merged, report_filename=REPORT_FILENAME):
+    path = os.path.join(directory, report_filename)
+    with open(path, 'w', encoding='utf-8', newline='') as reportfile:
+        writer = csv.writer(reportfile)
+        writer.writerow(('kept', 'duplicate'))
+        writer.writerows((kept, duplicate) for kept, duplicates in merged for duplicate in duplicates)
+    logging.info(f'DUPLICATE REPORT WRITTEN TO: {path}')
@@ -0,0 +1,165 @@
+import os
+import struct
+
+FLAC_STREAMINFO = 0
+FLAC_VORBIS_COMMENT = 4
+OGG_PAGE_HEADER = struct.Struct('<4sBBqIIIB')
+OGG_TAIL_SIZE = 64 * 1024
+MP4_CONTAINERS = {b'moov', b'udta', b'ilst'}
+MP4_TAGS = {b'\xa9ART': 0, b'\xa9nam': 1, b'\xa9alb': 2}
+VORBIS_TAGS = {'ARTIST': 0, 'TITLE': 1, 'ALBUM': 2}
+
+
+def _skip_id3v2(audiofile):
+    header = audiofile.read(10)
+    if header[:3] == b'ID3' and len(header) == 10:
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        audiofile.seek(10 + size + (10 if header[5] & 0x10 else 0))
+    else:
+        audiofile.seek(0)
+
+
+def _parse_vorbis_comment(data):
+    tags = [None, None, None]
+    vendor_length, = struct.unpack_from('<I', data, 0)
+    position = 4 + vendor_length
+    count, = struct.unpack_from('<I', data, position)
+    position += 4
+    for _ in range(count):
+        length, = struct.unpack_from('<I', data, position)
+        key, _, value = data[position + 4:position + 4 + length].decode('utf-8', errors='replace').partition('=')
+        position += 4 + length
+        index = VORBIS_TAGS.get(key.upper())
+        if index is not None and tags[index] is None:
+            tags[index] = value
+    return tags
+
+
+def read_flac_info(path):
+    with open(path, 'rb') as audiofile:
+        _skip_id3v2(audiofile)
+        if audiofile.read(4) != b'fLaC':
+            raise ValueError('missing fLaC marker')
+        tags, duration = [None, None, None], None
+        last = False
+        while not last:
+            header = audiofile.read(4)
+            if len(header) < 4:
+                raise ValueError('truncated FLAC metadata')
+            last, block_type, length = header[0] & 0x80, header[0] & 0x7F, int.from_bytes(header[1:4], 'big')
+            if block_type == FLAC_STREAMINFO:
+                info = audiofile.read(length)
+                sample_rate = int.from_bytes(info[10:13], 'big') >> 4
+                samples = int.from_bytes(info[13:18], 'big') & 0xFFFFFFFFF
+                duration = samples / sample_rate if sample_rate and samples else None
+            elif block_type == FLAC_VORBIS_COMMENT:
+                tags = _parse_vorbis_comment(audiofile.read(length))
+            else:
+                audiofile.seek(length, os.SEEK_CUR)
+    return (*tags, duration)
+
+
+def _ogg_packets(audiofile):
+    packet = b''
+    while True:
+        header = audiofile.read(OGG_PAGE_HEADER.size)
+        if len(header) < OGG_PAGE_HEADER.size:
+            return
+        capture, _, _, _, _, _, _, segment_count = OGG_PAGE_HEADER.unpack(header)
+        if capture != b'OggS':
+            raise ValueError('lost Ogg page sync')
+        for lacing in audiofile.read(segment_count):
+            packet += audiofile.read(lacing)
+            if lacing < 255:
+                yield packet
+                packet = b''
+
+
+def _last_granule(audiofile):
+    audiofile.seek(0, os.SEEK_END)
+    audiofile.seek(max(0, audiofile.tell() - OGG_TAIL_SIZE))
+    tail = audiofile.read()
+    position = tail.rfind(b'OggS')
+    while position >= 0:
+        if position + OGG_PAGE_HEADER.size <= len(tail):
+            granule = OGG_PAGE_HEADER.unpack_from(tail, position)[3]
+            if granule >= 0:
+                return granule
+        position = tail.rfind(b'OggS', 0, position)
+    return None
+
+
+def read_ogg_info(path):
+    with open(path, 'rb') as audiofile:
+        packets = _ogg_packets(audiofile)
+        identification = next(packets)
+        if identification.startswith(b'\x01vorbis'):
+            sample_rate, = struct.unpack_from('<I', identification, 12)
+            pre_skip, comment_prefix = 0, b'\x03vorbis'
+        elif identification.startswith(b'OpusHead'):
+            pre_skip, = struct.unpack_from('<H', identification, 10)
+            sample_rate, comment_prefix = 48000, b'OpusTags'
+        else:
+            raise ValueError('unsupported Ogg codec')
+        comment = next(packets)
+        if not comment.startswith(comment_prefix):
+            raise ValueError('missing Ogg comment header')
+        tags = _parse_vorbis_comment(comment[len(comment_prefix):])
+        granule = _last_granule(audiofile)
+    duration = (granule - pre_skip) / sample_rate if granule else None
+    return (*tags, duration)
+
+
+def _mp4_atoms(audiofile, end):
+    while audiofile.tell() + 8 <= end:
+        start = audiofile.tell()
+        size, kind = struct.unpack('>I4s', audiofile.read(8))
+        header_size = 8
+        if size == 1:
+            size, = struct.unpack('>Q', audiofile.read(8))
+            header_size = 16
+        elif size == 0:
+            size = end - start
+        if size < header_size:
+            raise ValueError(f'invalid MP4 atom size for {kind}')
+        yield kind, start + header_size, start + size
+        audiofile.seek(start + size)
+
+
+def _read_mp4_atoms(audiofile, end, tags, info):
+    for kind, body, atom_end in _mp4_atoms(audiofile, end):
+        if kind in MP4_CONTAINERS:
+            _read_mp4_atoms(audiofile, atom_end, tags, info)
+        elif kind == b'meta':
+            audiofile.seek(body + 4)
+            _read_mp4_atoms(audiofile, atom_end, tags, info)
+        elif kind == b'mvhd':
+            version = audiofile.read(1)[0]
+            audiofile.seek(body + (20 if version == 1 else 12))
+            if version == 1:
+                info['timescale'], info['duration'] = struct.unpack('>IQ', audiofile.read(12))
+            else:
+                info['timescale'], info['duration'] = struct.unpack('>II', audiofile.read(8))
+        elif kind in MP4_TAGS:
+            for data_kind, data_body, data_end in _mp4_atoms(audiofile, atom_end):
+                if data_kind == b'data':
+                    audiofile.seek(data_body + 8)
+                    tags[MP4_TAGS[kind]] = audiofile.read(data_end - data_body - 8).decode('utf-8', errors='replace')
+                    break
+
+
+def read_mp4_info(path):
+    tags, info = [None, None, None], {}
+    with open(path, 'rb') as audiofile:
+        _read_mp4_atoms(audiofile, os.fstat(audiofile.fileno()).st_size, tags, info)
+    duration = info['duration'] / info['timescale'] if info.get('timescale') else None
+    return (*tags, duration)
+
+
+READERS = {
+    '.flac': read_flac_info,
+    '.ogg': read_ogg_info,
+    '.oga': read_ogg_info,
+    '.opus': read_ogg_info,
+    '.m4a': read_mp4_info,
+}
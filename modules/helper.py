@@ -1,3 +1,4 @@
+import math
 import os
 
 from PyQt6.QtCore import Qt
@@ -43,6 +44,28 @@ class HelperWindow(QWidget):
         label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         return label
 
+    def render(self, state, changed):
+        if 'time' in changed:
+            self.time_label.setText(f'{state["time"]}')
+        if 'count' in changed:
+            self.track_count_label.setText(state['count'])
+        if not changed.isdisjoint(('anime', 'show_anime')):
+            self.title_label.setText(state.revealed('anime'))
+        if not changed.isdisjoint(('artist', 'show_artist')):
+            self.artist_label.setText(state.revealed('artist'))
+        if not changed.isdisjoint(('title', 'show_title')):
+            self.track_label.setText(state.revealed('title'))
+        if 'font_size' in changed and state['font_size']:
+            for label in (self.title_label, self.artist_label, self.track_label, self.time_label):
+                self._set_font_size(label, state['font_size'])
+            self._set_font_size(self.track_count_label, math.ceil(state['font_size'] / 2))
+
+    @staticmethod
+    def _set_font_size(label, size):
+        font = label.font()
+        font.setPointSize(size)
+        label.setFont(font)
+
     def closeEvent(self, a0: QCloseEvent) -> None:
         self.parent_window.reset_helper()
         self.parent_window.window_check.setChecked(False)
@@ -1,28 +1,59 @@
 import logging
 import os
 
-import eyed3
-import pandas as pd
+from modules.library_index import CompiledIndex, open_library_index
+from modules.metadata import read_all_track_info
+from modules.metadata_cache import cached_refresh_stream
+from modules.metadata_index import MetadataIndex
+from modules.profiler import profiled
+from modules.scanner import DEFAULT_EXTENSIONS, scan_audio_files
+from modules.session_store import SessionStore
+from modules.track import Track
+from modules.track_pool import TrackPool
+from modules.used_journal import UsedJournal, replay_journal
+
+TRACK_COLUMNS = ['artist TEXT', 'title TEXT', 'album TEXT', 'duration REAL']
 
 
 class LibraryHandler:
-    def __init__(self, directory, library_filename='_library.csv', get_all=True):
+    def __init__(self, directory, library_filename='_library.csv', get_all=True, workers=None, journal=False,
+                 extensions=DEFAULT_EXTENSIONS, room=None, load=True):
         super().__init__()
         self.directory = directory
-        self.used = self._get_used(directory)
         self.library_filename = library_filename
+        self.get_all = get_all
+        self.workers = workers
+        self.journal = journal
+        self.extensions = extensions
+        self.room = room
 
-        audio_files = [x for x in os.listdir(directory) if x.endswith('.mp3')]
-        library = self._read_library(directory, audio_files, get_all)
-        self.library = library[library['anime'] != 'pass'].set_index('filename')
-        logging.info(f'LIBRARY SIZE: {self.library.count()}')
+        self.session = SessionStore(directory, room) if room is not None else None
+        self._history = self.session.load() if self.session is not None else \
+            replay_journal(directory, self._get_used(directory))
+        self._history_set = set(self._history)
+        self.used = []
+        self.library = {}
+        self.durations = {}
+        self.start_offsets = {}
+        self.loudness = {}
+        self.audio_files = TrackPool()
+        self.files = set()
+        self.duplicates = set()
+        self.metadata_index = MetadataIndex()
+        self.from_tags = False
+        self.loaded = False
+        self.partial = False
+        self._journal = None
+        self._journaled = 0
 
-        self.audio_files = [x for x in audio_files if x in self.library.index and x not in self.used]
-        self.used = [x for x in self.used if x in self.library.index]
-        logging.info(f'AUDIO FILES: {len(self.audio_files)}')
+        if load:
+            for library, audio_files, durations in self.read_batches():
+                self.extend(library, audio_files, durations)
+            self.finish_loading()
 
+    @profiled('library.getitem')
     def __getitem__(self, item):
-        return self.library.loc[item]
+        return self.library[item]
 
     def _get_used(self, directory):
         try:
@@ -33,30 +64,216 @@ class LibraryHandler:
             logging.warning("USED NOT FOUND")
             return []
 
+    @profiled('library.write_used')
     def write_used(self):
+        if not self.loaded or self.partial:
+            return
+        if self.session is not None:
+            self.session.append(self.used[self._journaled:])
+            self._journaled = len(self.used)
+            return
+        if self._journal is not None:
+            self._journal.append(self.used[self._journaled:])
+            self._journaled = len(self.used)
+            return
         with open(os.path.join(self.directory, '_used.txt'), 'w', encoding='utf-8') as usedfile:
             logging.info(f'WRITING {len(self.used)} ENTRIES TO USED')
             usedfile.write("\n".join(self.used))
 
-    def _read_library(self, directory, audio_files, get_all):
-        columns_to_read = ['filename', 'artist', 'title', 'anime']
+    def known_audio_files(self):
+        return self.used + list(self.audio_files)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close(self.used)
+            self._journal = None
+        if self.session is not None:
+            self.session.close()
+        if isinstance(self.library, CompiledIndex):
+            self.library.close()
+
+    def read_batches(self, progress=lambda scanned, total: None, is_cancelled=lambda: False):
+        entries = scan_audio_files(self.directory, self.extensions)
+        scanned = 0
+        known = {}
+        metadata_index = MetadataIndex()
+        for library, names, durations in self._read_library(self.directory, entries, self.get_all, is_cancelled):
+            self.files.update(names)
+            scanned += len(names)
+            # the walk is streamed, so the total is only known once it finishes
+            progress(scanned, 0)
+            if library is not None:
+                known = library
+            yield library, [x for x in names if x in known], durations
+            # indexed only after the batch is out, so a large _library.csv does not hold back the first tracks
+            if library is not None:
+                for name, track in library.items():
+                    metadata_index.add(name, track)
+        # built off the GUI thread and published whole, so searches never see a half-built index
+        self.metadata_index = metadata_index
+        logging.info(f'METADATA INDEX BUILT: {len(metadata_index)} ENTRIES')
+
+    @profiled('library.extend')
+    def extend(self, library, audio_files, durations):
+        if isinstance(library, CompiledIndex):
+            self.library = library
+        elif library is not None:
+            self.library.update(library)
+            logging.debug(f'LIBRARY EXTENDED BY {len(library)} ENTRIES')
+        self.durations.update(durations)
+        for name in audio_files:
+            if name not in self._history_set:
+                self.audio_files.add(name)
+
+    @profiled('library.finish_loading')
+    def finish_loading(self, complete=True):
+        logging.info(f'LIBRARY SIZE: {len(self.library)}')
+        history = [x for x in self._history if x in self.library]
+        self.used[:0] = history
+        logging.info(f'AUDIO FILES: {len(self.audio_files)}')
+
+        if not complete:
+            # the history filtered against part of the library would drop entries, so nothing is written back
+            logging.warning(f'LIBRARY PARTIALLY LOADED: USED ENTRIES ARE NOT WRITTEN FOR {self.directory}')
+            self.partial = True
+        self._journal = UsedJournal(self.directory) if self.journal and self.session is None and complete else None
+        self._journaled = len(history)
+        self.loaded = True
+        return len(history)
+
+    @profiled('library.read_changes')
+    def read_changes(self, touched, library_changed=False):
+        # runs on the watcher's reader thread: files are only read here, apply_changes updates the handler
+        entries = []
+        for name in touched:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError as error:
+                logging.warning(f'CHANGED FILE UNREADABLE {name}: {error}')
+                continue
+            entries.append((name, stat.st_size, stat.st_mtime_ns))
+        track_infos = [entry for batch in cached_refresh_stream(self.directory, 'tracks', TRACK_COLUMNS, entries,
+                                                                read_all_track_info, self.workers, prune=False)
+                       for entry in batch]
+        library = self._open_library() if library_changed and not self.from_tags else None
+        return track_infos, library
+
+    @profiled('library.apply_changes')
+    def apply_changes(self, touched, removed, track_infos, library=None):
+        removed = self._expand_removed(removed) - touched
+        played = self._played(removed)
+        removed_positions = [position for position, name in enumerate(self.used) if name in played] if played else []
+        for position in reversed(removed_positions):
+            del self.used[position]
+        self._journaled -= sum(1 for position in removed_positions if position < self._journaled)
+        for name in removed:
+            self.files.discard(name)
+            self.audio_files.discard(name)
+            self.durations.pop(name, None)
+            self.start_offsets.pop(name, None)
+            self.loudness.pop(name, None)
+            self._history_set.discard(name)
+            if self.from_tags:
+                self.library.pop(name, None)
+                self.metadata_index.discard(name)
+
+        played = self._played(name for name, _ in track_infos)
+        for name, track_info in track_infos:
+            self.files.add(name)
+            self.durations[name] = track_info[3]
+            self.start_offsets.pop(name, None)
+            self.loudness.pop(name, None)
+            if self.from_tags:
+                if track_info[2] != 'pass':
+                    self.library[name] = Track(*track_info[:3])
+                    self.metadata_index.add(name, self.library[name])
+                else:
+                    self.library.pop(name, None)
+                    self.metadata_index.discard(name)
+            self._update_pool(name, played)
+
+        if library is not None:
+            self._replace_library(library)
+        logging.info(f'LIBRARY CHANGES APPLIED: {len(track_infos)} READ, {len(removed)} REMOVED, '
+                     f'{len(removed_positions)} USED ENTRIES DROPPED')
+        return removed_positions
+
+    @profiled('library.collapse_duplicates')
+    def collapse_duplicates(self, groups):
+        positions = {}
+        for position, name in enumerate(self.used):
+            positions.setdefault(name, position)
+        merged = []
+        dropped = set()
+        for group in groups:
+            group = [name for name in group if name in self.library]
+            if len(group) < 2:
+                continue
+            # the copy played first stays, so the session history keeps pointing at what was actually heard
+            kept = min(group, key=lambda name: (positions.get(name, len(self.used)), name))
+            duplicates = [name for name in group if name != kept]
+            merged.append((kept, duplicates))
+            dropped.update(duplicates)
+            self.duplicates.update(duplicates)
+            for name in duplicates:
+                self.audio_files.discard(name)
+        removed_positions = [position for position, name in enumerate(self.used) if name in dropped]
+        for position in reversed(removed_positions):
+            del self.used[position]
+        self._journaled -= sum(1 for position in removed_positions if position < self._journaled)
+        logging.info(f'COLLAPSED {len(merged)} DUPLICATE GROUPS: {len(dropped)} FILES DROPPED FROM THE ROUND')
+        return removed_positions, merged
+
+    def _expand_removed(self, removed):
+        directories = tuple(name for name in removed if name == '' or name.endswith('/'))
+        if not directories:
+            return set(removed)
+        return {name for name in removed if name not in directories} | \
+            {name for name in self.files if name.startswith(directories)}
+
+    def _update_pool(self, name, used):
+        if name in self.library and name not in used and name not in self._history_set and \
+                name not in self.duplicates:
+            self.audio_files.add(name)
+        else:
+            self.audio_files.discard(name)
+
+    def _played(self, names):
+        # only known files outside the pool can be in used, so the used list is not scanned for new files
+        candidates = {name for name in names if name in self.files and name not in self.audio_files}
+        return candidates.intersection(self.used) if candidates else set()
+
+    def _open_library(self):
+        try:
+            return open_library_index(os.path.join(self.directory, self.library_filename), self.get_all)
+        except (OSError, ValueError, StopIteration) as error:
+            logging.warning(f'{self.library_filename} RELOAD FAILED ({error}): KEEPING PREVIOUS LIBRARY')
+            return None
+
+    def _replace_library(self, library):
+        if isinstance(self.library, CompiledIndex):
+            self.library.close()
+        self.library = library
+        self.metadata_index = MetadataIndex(library.items())
+        used = set(self.used)
+        for name in self.files:
+            self._update_pool(name, used)
+        logging.info(f'LIBRARY RELOADED: {len(self.library)} ENTRIES')
+
+    def _read_library(self, directory, entries, get_all, is_cancelled, batch_size=500):
         try:
-            if not get_all:
-                columns_to_read.append('take')
-            return pd.read_csv(os.path.join(directory, self.library_filename), encoding='utf-8') \
-                [columns_to_read].dropna()
+            library = open_library_index(os.path.join(directory, self.library_filename), get_all)
         except:
             logging.warning("{} read failed: fallback to metadata from files".format(self.library_filename))
-            data = []
-            for name in audio_files:
-                audiofile = eyed3.load(os.path.join(directory, name))
-                data.append(
-                    (
-                        name,
-                        audiofile.tag.artist,
-                        audiofile.tag.title,
-                        audiofile.tag.album
-                    )
-                )
-
-            return pd.DataFrame(data, columns=columns_to_read)
+            library = None
+        self.from_tags = from_tags = library is None
+        for batch in cached_refresh_stream(directory, 'tracks', TRACK_COLUMNS, entries, read_all_track_info,
+                                           self.workers, batch_size):
+            if is_cancelled():
+                return
+            if from_tags:
+                library = {name: Track(*track_info[:3]) for name, track_info in batch if track_info[2] != 'pass'}
+            yield library, [name for name, _ in batch], {name: track_info[3] for name, track_info in batch}
+            library = None
+        if library is not None:
+            yield library, [], {}
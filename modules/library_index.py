@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+from modules.track import Track
+
+MAGIC = b'OPIX'
+VERSION = 1
+INDEX_SUFFIX = '.idx'
+HASH_CHUNK_SIZE = 1 << 20
+TAKE_FLAG = 0x01
+
+# magic, version, csv size, csv mtime, csv hash, records, records with take, buckets, 3 section offsets
+HEADER = struct.Struct('<4sIQQ16sIIIQQQ')
+# (offset, length) of filename, artist, title and anime in the string table, flags
+RECORD = struct.Struct('<9I')
+BUCKET = struct.Struct('<I')
+
+
+def read_csv_rows(path):
+    with open(path, encoding='utf-8', newline='') as libraryfile:
+        reader = csv.reader(libraryfile)
+        header = next(reader)
+        positions = [header.index(column) for column in ('filename', 'artist', 'title', 'anime')]
+        take = header.index('take') if 'take' in header else None
+        last_position = max(positions)
+        for row in reader:
+            # rows missing any of the read columns are skipped, like empty cells used to be dropped
+            if len(row) <= last_position or not all(row[position] for position in positions):
+                continue
+            filename, artist, title, anime = (row[position] for position in positions)
+            if anime != 'pass':
+                yield filename, artist, title, anime, take is not None and len(row) > take and bool(row[take])
+
+
+def read_csv_library(path, get_all=True):
+    return {row[0]: Track(*row[1:4]) for row in read_csv_rows(path) if get_all or row[4]}
+
+
+def _hash_file(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as csvfile:
+        for chunk in iter(lambda: csvfile.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def build_index(csv_path, index_path, csv_size, csv_mtime, csv_hash):
+    strings = bytearray()
+    records = []
+    positions = {}
+    for filename, *values, take in read_csv_rows(csv_path):
+        record = []
+        for value in (filename, *values):
+            data = value.encode('utf-8')
+            record += (len(strings), len(data))
+            strings += data
+        record.append(TAKE_FLAG if take else 0)
+        if filename in positions:
+            records[positions[filename]] = record
+        else:
+            positions[filename] = len(records)
+            records.append(record)
+
+    bucket_count = 8
+    while bucket_count < 2 * len(records):
+        bucket_count <<= 1
+    buckets = [0] * bucket_count
+    for number, record in enumerate(records, start=1):
+        slot = zlib.crc32(strings[record[0]:record[0] + record[1]]) & (bucket_count - 1)
+        while buckets[slot]:
+            slot = (slot + 1) & (bucket_count - 1)
+        buckets[slot] = number
+
+    records_offset = HEADER.size
+    buckets_offset = records_offset + RECORD.size * len(records)
+    strings_offset = buckets_offset + BUCKET.size * bucket_count
+    take_count = sum(record[8] & TAKE_FLAG for record in records)
+    # a unique temporary file, so instances sharing the directory never write into each other's index
+    descriptor, temporary_path = tempfile.mkstemp(prefix=f'{os.path.basename(index_path)}.', suffix='.tmp',
+                                                  dir=os.path.dirname(index_path) or '.')
+    try:
+        with open(descriptor, 'wb') as indexfile:
+            indexfile.write(HEADER.pack(MAGIC, VERSION, csv_size, csv_mtime, csv_hash, len(records), take_count,
+                                        bucket_count, records_offset, buckets_offset, strings_offset))
+            indexfile.write(b''.join(RECORD.pack(*record) for record in records))
+            indexfile.write(struct.pack(f'<{bucket_count}I', *buckets))
+            indexfile.write(strings)
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, index_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+    logging.info(f'LIBRARY INDEX BUILT: {len(records)} ENTRIES')
+
+
+class CompiledIndex:
+    def __init__(self, path, get_all=True):
+        self.get_all = get_all
+        with open(path, 'rb') as indexfile:
+            self._map = mmap.mmap(indexfile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, _, _, self._record_count, self._take_count, bucket_count, self._records_offset, \
+            self._buckets_offset, self._strings_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a version {VERSION} library index')
+        self._mask = bucket_count - 1
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self._record_count if self.get_all else self._take_count
+
+    def __contains__(self, filename):
+        record = self._find(filename)
+        return record is not None and (self.get_all or record[8] & TAKE_FLAG)
+
+    def __getitem__(self, filename):
+        record = self._find(filename)
+        if record is None or not (self.get_all or record[8] & TAKE_FLAG):
+            raise KeyError(filename)
+        return self._track(record)
+
+    def get(self, filename, default=None):
+        try:
+            return self[filename]
+        except KeyError:
+            return default
+
+    def items(self):
+        for number in range(self._record_count):
+            record = RECORD.unpack_from(self._map, self._records_offset + RECORD.size * number)
+            if self.get_all or record[8] & TAKE_FLAG:
+                yield self._string(record[0], record[1]), self._track(record)
+
+    def _string(self, offset, length):
+        start = self._strings_offset + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def _track(self, record):
+        return Track(self._string(record[2], record[3]), self._string(record[4], record[5]),
+                     self._string(record[6], record[7]))
+
+    def _find(self, filename):
+        key = filename.encode('utf-8')
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            number, = BUCKET.unpack_from(self._map, self._buckets_offset + BUCKET.size * slot)
+            if number == 0:
+                return None
+            record = RECORD.unpack_from(self._map, self._records_offset + RECORD.size * (number - 1))
+            start = self._strings_offset + record[0]
+            if record[1] == len(key) and self._map[start:start + record[1]] == key:
+                return record
+            slot = (slot + 1) & self._mask
+
+
+def _read_stamp(index_path):
+    with open(index_path, 'rb') as indexfile:
+        header = indexfile.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, version, csv_size, csv_mtime, csv_hash = HEADER.unpack(header)[:5]
+    return (csv_size, csv_mtime, csv_hash) if magic == MAGIC and version == VERSION else None
+
+
+def _update_stamp(index_path, csv_size, csv_mtime):
+    with open(index_path, 'r+b') as indexfile:
+        indexfile.seek(8)
+        indexfile.write(struct.pack('<QQ', csv_size, csv_mtime))
+
+
+def open_library_index(csv_path, get_all=True):
+    stat = os.stat(csv_path)
+    index_path = csv_path + INDEX_SUFFIX
+    try:
+        stamp = _read_stamp(index_path)
+    except OSError:
+        stamp = None
+    try:
+        if stamp is None or stamp[:2] != (stat.st_size, stat.st_mtime_ns):
+            csv_hash = _hash_file(csv_path)
+            if stamp is not None and stamp[2] == csv_hash:
+                logging.info('LIBRARY INDEX UP TO DATE: CSV TOUCHED ONLY')
+                _update_stamp(index_path, stat.st_size, stat.st_mtime_ns)
+            else:
+                build_index(csv_path, index_path, stat.st_size, stat.st_mtime_ns, csv_hash)
+        return CompiledIndex(index_path, get_all)
+    except (OSError, ValueError) as error:
+        logging.warning(f'LIBRARY INDEX UNAVAILABLE ({error}): reading {csv_path} into memory')
+        return read_csv_library(csv_path, get_all)
@@ -0,0 +1,116 @@
+import logging
+import queue
+from concurrent.futures import CancelledError
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from modules.dedupe import find_duplicates
+from modules.process_pool import ProcessPool
+
+
+class LibraryLoader(QThread):
+    progress = pyqtSignal(int, int)
+    batch_loaded = pyqtSignal(object, object, object)
+    loaded = pyqtSignal(bool)
+
+    def __init__(self, library_handler):
+        super().__init__()
+        self.library_handler = library_handler
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            for library, audio_files, durations in self.library_handler.read_batches(self.progress.emit,
+                                                                                     lambda: self._cancelled):
+                if self._cancelled:
+                    break
+                self.batch_loaded.emit(library, audio_files, durations)
+        except Exception:
+            logging.exception(f'LIBRARY LOAD FAILED: {self.library_handler.directory}')
+            self._cancelled = True
+        self.loaded.emit(self._cancelled)
+
+
+class LibraryAnalyser(QThread):
+    batch_analysed = pyqtSignal(object)
+
+    def __init__(self, directory, audio_files, batches, workers=None):
+        super().__init__()
+        self.directory = directory
+        self.audio_files = audio_files
+        # batches(directory, audio_files, pool) yields {filename: result} dicts, e.g. start_offset_batches
+        self.batches = batches
+        self.pool = ProcessPool(workers)
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+        self.pool.cancel()
+
+    def run(self):
+        try:
+            with self.pool:
+                for results in self.batches(self.directory, self.audio_files, self.pool):
+                    if self._cancelled:
+                        break
+                    self.batch_analysed.emit(results)
+        except CancelledError:
+            logging.info(f'LIBRARY ANALYSIS CANCELLED: {self.directory}')
+        except Exception:
+            logging.exception(f'LIBRARY ANALYSIS FAILED: {self.directory}')
+
+
+class LibraryChangeReader(QThread):
+    read = pyqtSignal(object, object, object, object)
+
+    def __init__(self, library_handler):
+        super().__init__()
+        self.library_handler = library_handler
+        # change sets are read one after another, so they reach the GUI thread in the order they happened
+        self._queue = queue.Queue()
+
+    def submit(self, touched, removed, library_changed):
+        self._queue.put((touched, removed, library_changed))
+
+    def stop(self):
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            changes = self._queue.get()
+            if changes is None:
+                break
+            touched, removed, library_changed = changes
+            try:
+                track_infos, library = self.library_handler.read_changes(touched, library_changed)
+            except Exception:
+                logging.exception(f'LIBRARY CHANGES NOT READ: {self.library_handler.directory}')
+                continue
+            self.read.emit(touched, removed, track_infos, library)
+
+
+class LibraryDeduper(QThread):
+    deduplicated = pyqtSignal(object)
+
+    def __init__(self, directory, audio_files, workers=None):
+        super().__init__()
+        self.directory = directory
+        self.audio_files = audio_files
+        self.pool = ProcessPool(workers)
+
+    def cancel(self):
+        self.pool.cancel()
+
+    def run(self):
+        try:
+            with self.pool:
+                groups = find_duplicates(self.directory, self.audio_files, self.pool)
+            self.deduplicated.emit(groups)
+        except CancelledError:
+            logging.info(f'LIBRARY DEDUPLICATION CANCELLED: {self.directory}')
+        except Exception:
+            logging.exception(f'LIBRARY DEDUPLICATION FAILED: {self.directory}')
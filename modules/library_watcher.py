@@ -0,0 +1,210 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import threading
+
+from PyQt6.QtCore import QObject, QSocketNotifier, QThread, QTimer, pyqtSignal
+
+from modules.scanner import DEFAULT_EXTENSIONS, normalise_extensions, scan_audio_files
+
+POLL_INTERVAL = 5.0
+DEBOUNCE_MS = 500
+READ_SIZE = 64 * 1024
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# wd, mask, cookie, name length
+EVENT = struct.Struct('iIII')
+
+
+def _library_stamp(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+# both watchers emit changed(touched, removed, library_changed): touched holds added or modified files, removed
+# holds deleted files and deleted directories as 'prefix/' entries, library_changed flags a library file edit
+class InotifyWatcher(QObject):
+    changed = pyqtSignal(object, object, bool)
+
+    def __init__(self, directory, library_filename, extensions=DEFAULT_EXTENSIONS):
+        super().__init__()
+        self.directory = directory
+        self.library_filename = library_filename
+        self.extensions = normalise_extensions(extensions)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._prefixes = {}
+        try:
+            self._watch_tree(directory, '', strict=True)
+        except OSError:
+            os.close(self._fd)
+            raise
+        self._touched = set()
+        self._removed = set()
+        self._library_changed = False
+        self._notifier = QSocketNotifier(self._fd, QSocketNotifier.Type.Read)
+        self._notifier.setEnabled(False)
+        self._notifier.activated.connect(self._read_events)
+        self._debounce = QTimer()
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(DEBOUNCE_MS)
+        self._debounce.timeout.connect(self._emit_changes)
+
+    def start(self):
+        logging.info(f'WATCHING {len(self._prefixes)} DIRECTORIES WITH INOTIFY: {self.directory}')
+        self._notifier.setEnabled(True)
+
+    def stop(self):
+        if self._fd < 0:
+            return
+        self._debounce.stop()
+        self._notifier.setEnabled(False)
+        os.close(self._fd)
+        self._fd = -1
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def _watch_tree(self, path, prefix, strict=False):
+        pending = [(path, prefix)]
+        while pending:
+            path, prefix = pending.pop()
+            try:
+                wd = self._add_watch(path)
+            except OSError as error:
+                if strict:
+                    raise
+                logging.warning(f'WATCH SKIPPED {path}: {error}')
+                continue
+            # adding a watch on an already watched inode returns its descriptor, which also breaks symlink loops
+            if wd in self._prefixes:
+                continue
+            self._prefixes[wd] = prefix
+            try:
+                with os.scandir(path) as entries:
+                    pending.extend((entry.path, f'{prefix}{entry.name}/') for entry in entries
+                                   if not entry.name.startswith('.') and entry.is_dir())
+            except OSError as error:
+                logging.warning(f'WATCH SKIPPED {path}: {error}')
+
+    def _unwatch_prefix(self, prefix):
+        for wd in [wd for wd, watched in self._prefixes.items() if watched.startswith(prefix)]:
+            self._libc.inotify_rm_watch(self._fd, wd)
+            del self._prefixes[wd]
+
+    def _read_events(self):
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            position = 0
+            while position < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, position)
+                name = data[position + EVENT.size:position + EVENT.size + length].rstrip(b'\x00')
+                position += EVENT.size + length
+                self._handle_event(wd, mask, os.fsdecode(name))
+        self._debounce.start()
+
+    def _handle_event(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            logging.warning('INOTIFY QUEUE OVERFLOW: RESCANNING LIBRARY')
+            self._removed.add('')
+            self._touched.update(entry[0] for entry in scan_audio_files(self.directory, self.extensions))
+            self._library_changed = True
+            return
+        if mask & IN_IGNORED:
+            self._prefixes.pop(wd, None)
+            return
+        prefix = self._prefixes.get(wd)
+        if prefix is None or not name or name.startswith('.'):
+            return
+        relative = prefix + name
+        if mask & IN_ISDIR:
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._unwatch_prefix(relative + '/')
+                self._removed.add(relative + '/')
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                path = os.path.join(self.directory, relative)
+                self._watch_tree(path, relative + '/')
+                self._touched.update(f'{relative}/{entry[0]}' for entry in scan_audio_files(path, self.extensions))
+        elif prefix == '' and name == self.library_filename:
+            self._library_changed = True
+        elif name.lower().endswith(self.extensions):
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._touched.discard(relative)
+                self._removed.add(relative)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._touched.add(relative)
+
+    def _emit_changes(self):
+        touched, removed, library_changed = self._touched, self._removed, self._library_changed
+        self._touched, self._removed, self._library_changed = set(), set(), False
+        if touched or removed or library_changed:
+            self.changed.emit(touched, removed, library_changed)
+
+
+class PollingWatcher(QThread):
+    changed = pyqtSignal(object, object, bool)
+
+    def __init__(self, directory, library_filename, extensions=DEFAULT_EXTENSIONS, interval=POLL_INTERVAL):
+        super().__init__()
+        self.directory = directory
+        self.library_filename = library_filename
+        self.extensions = extensions
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        self.wait()
+
+    def _snapshot(self):
+        return {name: (size, mtime) for name, size, mtime in scan_audio_files(self.directory, self.extensions)}
+
+    def run(self):
+        logging.info(f'POLLING EVERY {self.interval} S: {self.directory}')
+        library_path = os.path.join(self.directory, self.library_filename)
+        snapshot = self._snapshot()
+        library_stamp = _library_stamp(library_path)
+        while not self._stopped.wait(self.interval):
+            current = self._snapshot()
+            current_library_stamp = _library_stamp(library_path)
+            touched = {name for name, stamp in current.items() if snapshot.get(name) != stamp}
+            removed = {name for name in snapshot if name not in current}
+            library_changed = current_library_stamp != library_stamp
+            snapshot, library_stamp = current, current_library_stamp
+            if touched or removed or library_changed:
+                self.changed.emit(touched, removed, library_changed)
+
+
+def create_library_watcher(directory, library_filename, extensions=DEFAULT_EXTENSIONS, interval=POLL_INTERVAL):
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory, library_filename, extensions)
+        except (OSError, AttributeError) as error:
+            logging.info(f'INOTIFY UNAVAILABLE ({error}): FALLING BACK TO POLLING')
+    return PollingWatcher(directory, library_filename, extensions, interval)
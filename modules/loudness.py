@@ -0,0 +1,85 @@
+import logging
+import subprocess
+import wave
+from functools import partial
+
+import numpy as np
+
+from modules.analysis import cached_analysis_batches, ffmpeg_decoder, map_tracks, wave_decoder
+
+LOUDNESS_SAMPLE_RATE = 22050
+BLOCK_SECONDS = 0.4
+BLOCK_STEP_SECONDS = 0.1
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+
+def loudness_decoder(path):
+    if path.lower().endswith('.wav'):
+        return wave_decoder(path)
+    return ffmpeg_decoder(path, LOUDNESS_SAMPLE_RATE)
+
+
+def _biquad_response(b, a, z):
+    return (b[0] + b[1] / z + b[2] / z ** 2) / (a[0] + a[1] / z + a[2] / z ** 2)
+
+
+def k_weighting(frequencies, sample_rate):
+    # the two BS.1770 stages (high shelf, then RLB high-pass), re-derived for any sample rate
+    z = np.exp(2j * np.pi * frequencies / sample_rate)
+    k = np.tan(np.pi * 1681.9744509555319 / sample_rate)
+    q = 0.7071752369554193
+    shelf_gain = 10 ** (3.99984385397 / 20)
+    band_gain = shelf_gain ** 0.4996667741545416
+    shelf = _biquad_response((shelf_gain + band_gain * k / q + k * k, 2 * (k * k - shelf_gain),
+                              shelf_gain - band_gain * k / q + k * k),
+                             (1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k), z)
+    k = np.tan(np.pi * 38.13547087613982 / sample_rate)
+    q = 0.5003270373253953
+    high_pass = _biquad_response((1.0, -2.0, 1.0), (1.0, 2 * (k * k - 1) / (1 + k / q + k * k),
+                                                    (1 - k / q + k * k) / (1 + k / q + k * k)), z)
+    return shelf * high_pass
+
+
+def integrated_loudness(samples, sample_rate):
+    block = int(BLOCK_SECONDS * sample_rate)
+    step = int(BLOCK_STEP_SECONDS * sample_rate)
+    if len(samples) < block:
+        return None
+    # filtering is a multiplication in the frequency domain; the zero padding keeps the filter tail from wrapping
+    size = 1 << int(len(samples) + sample_rate).bit_length()
+    spectrum = np.fft.rfft(samples, size, axis=0)
+    response = k_weighting(np.fft.rfftfreq(size, 1 / sample_rate), sample_rate)
+    weighted = np.fft.irfft(spectrum * (response if spectrum.ndim == 1 else response[:, None]), size,
+                            axis=0)[:len(samples)]
+    power = np.square(weighted)
+    if power.ndim > 1:
+        power = power.sum(axis=1)
+    sums = np.concatenate(([0.0], np.cumsum(power)))
+    starts = np.arange(0, len(samples) - block + 1, step)
+    blocks = (sums[starts + block] - sums[starts]) / block
+    gated = blocks[blocks > 10 ** ((ABSOLUTE_GATE_LUFS + 0.691) / 10)]
+    if len(gated) == 0:
+        return None
+    gated = gated[gated > gated.mean() * 10 ** (RELATIVE_GATE_LU / 10)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def measure_track(path, decoder=loudness_decoder):
+    try:
+        samples, sample_rate = decoder(path)
+    except (OSError, EOFError, ValueError, wave.Error, subprocess.CalledProcessError) as error:
+        logging.warning(f'LOUDNESS ANALYSIS FAILED FOR {path}: {error}')
+        return None
+    return integrated_loudness(samples, sample_rate)
+
+
+def measure_tracks(directory, names, pool, decoder=loudness_decoder):
+    return [(entry,) for entry in map_tracks(directory, names, partial(measure_track, decoder=decoder), pool)]
+
+
+def loudness_batches(directory, names, pool, decoder=loudness_decoder, batch_size=64):
+    for batch in cached_analysis_batches(directory, names, 'loudness', ['lufs REAL'],
+                                         partial(measure_tracks, decoder=decoder), pool,
+                                         decoder is loudness_decoder, batch_size):
+        yield {name: entry[0] for name, entry in batch}
@@ -0,0 +1,288 @@
+import io
+import logging
+import os
+import struct
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.formats import READERS
+
+ID3V2_HEADER_SIZE = 10
+ID3V1_SIZE = 128
+FRAME_SEARCH_SIZE = 64 * 1024
+FRAME_INDEX_WINDOW = 256 * 1024
+
+FRAME_IDS = {
+    2: (b'TP1', b'TT2', b'TAL'),
+    3: (b'TPE1', b'TIT2', b'TALB'),
+    4: (b'TPE1', b'TIT2', b'TALB'),
+}
+
+TEXT_ENCODINGS = {
+    0: 'latin-1',
+    1: 'utf-16',
+    2: 'utf-16-be',
+    3: 'utf-8',
+}
+
+MPEG_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+MPEG_LAYERS = {1: 3, 2: 2, 3: 1}
+
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_text(data):
+    if not data:
+        return None
+    encoding = TEXT_ENCODINGS.get(data[0], 'latin-1')
+    text = data[1:].decode(encoding, errors='replace')
+    # ID3v2.4 separates multiple values with NUL, keep the first one like a plain text frame
+    return text.strip('\x00').split('\x00')[0]
+
+
+def _frame_header(header, version):
+    if version == 2:
+        return header[:3], int.from_bytes(header[3:6], 'big'), 0
+    size = int.from_bytes(header[4:8], 'big') if version == 3 else _syncsafe(header[4:8])
+    return header[:4], size, int.from_bytes(header[8:10], 'big')
+
+
+def _parse_id3v2_frames(tagfile, tag_end, version):
+    wanted = FRAME_IDS[version]
+    header_size = 6 if version == 2 else 10
+    found = {}
+    while len(found) < len(wanted) and tagfile.tell() + header_size <= tag_end:
+        header = tagfile.read(header_size)
+        if len(header) < header_size or header[:1] == b'\x00':
+            break
+        frame_id, size, flags = _frame_header(header, version)
+        if frame_id not in wanted or frame_id in found:
+            # cover art and other large frames are skipped without being read
+            tagfile.seek(size, os.SEEK_CUR)
+            continue
+        if version == 3 and flags & 0x00C0 or version == 4 and flags & 0x000D:
+            raise ValueError(f'unsupported frame flags {flags:#06x} in {frame_id}')
+        data = tagfile.read(min(size, tag_end - tagfile.tell()))
+        if version == 4 and flags & 0x0002:
+            data = data.replace(b'\xff\x00', b'\xff')
+        found[frame_id] = _decode_text(data)
+    if not found:
+        return None
+    return tuple(found.get(frame_id) for frame_id in wanted)
+
+
+def _read_id3v2(audiofile):
+    header = audiofile.read(ID3V2_HEADER_SIZE)
+    if len(header) < ID3V2_HEADER_SIZE or header[:3] != b'ID3':
+        return None
+    version, flags = header[3], header[5]
+    if version not in FRAME_IDS:
+        raise ValueError(f'unsupported ID3v2.{version} tag')
+    tagfile, tag_end = audiofile, ID3V2_HEADER_SIZE + _syncsafe(header[6:10])
+    if flags & 0x80 and version < 4:
+        # whole-tag unsynchronisation changes the frame sizes on disk, so only these tags are decoded in memory
+        tag = audiofile.read(tag_end - ID3V2_HEADER_SIZE).replace(b'\xff\x00', b'\xff')
+        tagfile, tag_end = io.BytesIO(tag), len(tag)
+    if flags & 0x40 and version > 2:
+        extended = tagfile.read(4)
+        extended_size = _syncsafe(extended) if version == 4 else int.from_bytes(extended, 'big') + 4
+        tagfile.seek(extended_size - 4, os.SEEK_CUR)
+    return _parse_id3v2_frames(tagfile, tag_end, version)
+
+
+def _read_id3v1(audiofile):
+    audiofile.seek(0, os.SEEK_END)
+    if audiofile.tell() < ID3V1_SIZE:
+        return None
+    audiofile.seek(-ID3V1_SIZE, os.SEEK_END)
+    tag = audiofile.read(ID3V1_SIZE)
+    if tag[:3] != b'TAG':
+        return None
+    fields = (tag[33:63], tag[3:33], tag[63:93])
+    return tuple(field.split(b'\x00')[0].decode('latin-1').strip() or None for field in fields)
+
+
+def _read_tags_with_eyed3(path):
+    import eyed3
+    audiofile = eyed3.load(path)
+    if audiofile is None or audiofile.tag is None:
+        return None, None, None
+    return audiofile.tag.artist, audiofile.tag.title, audiofile.tag.album
+
+
+def read_tags(path):
+    try:
+        with open(path, 'rb') as audiofile:
+            tags = _read_id3v2(audiofile) or _read_id3v1(audiofile)
+    except (ValueError, IndexError, LookupError) as error:
+        logging.debug(f'TAG READER FALLBACK TO EYED3 FOR {path}: {error}')
+        return _read_tags_with_eyed3(path)
+    if tags is None:
+        logging.warning(f'NO TAGS FOUND: {path}')
+        return None, None, None
+    return tags
+
+
+def parse_frame_header(header):
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = MPEG_VERSIONS.get((header[1] >> 3) & 0x03)
+    layer = MPEG_LAYERS.get((header[1] >> 1) & 0x03)
+    bitrate_index, sample_rate_index = header[2] >> 4, (header[2] >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = BITRATES[(min(version, 2), layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version != 1:
+        samples, length = 576, 72 * bitrate // sample_rate + padding
+    else:
+        samples, length = 1152, 144 * bitrate // sample_rate + padding
+    return {
+        'version': version,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'samples': samples,
+        'length': length,
+        'mono': header[3] >> 6 == 3,
+    }
+
+
+def find_first_frame(data):
+    position = data.find(b'\xff')
+    while 0 <= position < len(data) - 4:
+        frame = parse_frame_header(data[position:position + 4])
+        # require the following frame to line up too, so stray 0xFF bytes are not taken for a sync word
+        if frame is not None and (position + frame['length'] + 2 > len(data) or
+                                  parse_frame_header(data[position + frame['length']:][:4]) is not None):
+            return position, frame
+        position = data.find(b'\xff', position + 1)
+    return None
+
+
+def id3v2_end(header):
+    if len(header) < ID3V2_HEADER_SIZE or header[:3] != b'ID3':
+        return 0
+    return ID3V2_HEADER_SIZE + _syncsafe(header[6:10]) + (ID3V2_HEADER_SIZE if header[5] & 0x10 else 0)
+
+
+def mp3_audio_bounds(data):
+    audio_start, audio_end = id3v2_end(data[:ID3V2_HEADER_SIZE]), len(data)
+    if audio_end - audio_start >= ID3V1_SIZE and data[audio_end - ID3V1_SIZE:audio_end - ID3V1_SIZE + 3] == b'TAG':
+        audio_end -= ID3V1_SIZE
+    return audio_start, audio_end
+
+
+def _vbr_header(data, position, frame):
+    # frame count of a Xing/Info/VBRI frame (0 when it has none), None when the frame carries audio
+    side_info = (17 if frame['mono'] else 32) if frame['version'] == 1 else (9 if frame['mono'] else 17)
+    xing = position + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        return int.from_bytes(data[xing + 8:xing + 12], 'big') if data[xing + 7] & 0x01 else 0
+    if data[position + 36:position + 40] == b'VBRI':
+        return int.from_bytes(data[position + 50:position + 54], 'big')
+    return None
+
+
+def _mp3_file_bounds(audiofile):
+    file_size = os.fstat(audiofile.fileno()).st_size
+    audiofile.seek(0)
+    audio_start, audio_end = id3v2_end(audiofile.read(ID3V2_HEADER_SIZE)), file_size
+    if audio_end - audio_start >= ID3V1_SIZE:
+        audiofile.seek(audio_end - ID3V1_SIZE)
+        if audiofile.read(3) == b'TAG':
+            audio_end -= ID3V1_SIZE
+    return audio_start, audio_end
+
+
+def _find_first_frame(audiofile, audio_start):
+    audiofile.seek(audio_start)
+    data = audiofile.read(FRAME_SEARCH_SIZE)
+    found = find_first_frame(data)
+    if found is None:
+        raise ValueError('no MPEG audio frame found')
+    return data, *found
+
+
+def index_frames(path):
+    with open(path, 'rb') as audiofile:
+        audio_start, audio_end = _mp3_file_bounds(audiofile)
+        data, position, frame = _find_first_frame(audiofile, audio_start)
+        sample_rate, samples = frame['sample_rate'], frame['samples']
+        # the Xing/VBRI frame describes the whole file, so it must not end up at the start of a clip
+        if _vbr_header(data, position, frame) is not None:
+            position += frame['length']
+        position += audio_start
+        # only a window of the file is held at a time, whatever its size
+        window, window_start = data, audio_start
+        offsets = array('I')
+        while position + 4 <= audio_end:
+            if position + 4 > window_start + len(window):
+                audiofile.seek(position)
+                window, window_start = audiofile.read(FRAME_INDEX_WINDOW), position
+            frame = parse_frame_header(window[position - window_start:position - window_start + 4])
+            # trailing APE or Lyrics tags end the stream just like the end of the file does
+            if frame is None or frame['sample_rate'] != sample_rate:
+                break
+            offsets.append(position)
+            position += frame['length']
+    offsets.append(min(position, audio_end))
+    return sample_rate, samples, offsets
+
+
+def _read_mp3_duration(audiofile):
+    audio_start, audio_end = _mp3_file_bounds(audiofile)
+    data, position, frame = _find_first_frame(audiofile, audio_start)
+    frames = _vbr_header(data, position, frame)
+    if frames:
+        return frames * frame['samples'] / frame['sample_rate']
+    return (audio_end - audio_start - position) * 8 / frame['bitrate']
+
+
+def read_duration(path):
+    try:
+        with open(path, 'rb') as audiofile:
+            return _read_mp3_duration(audiofile)
+    except (ValueError, IndexError) as error:
+        logging.warning(f'DURATION UNKNOWN FOR {path}: {error}')
+        return None
+
+
+def read_track_info(path):
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    try:
+        if reader is None:
+            return (*read_tags(path), read_duration(path))
+        return reader(path)
+    # a file that cannot be opened, e.g. removed since the scan, must not abort the whole load
+    except (OSError, ValueError, IndexError, StopIteration, struct.error) as error:
+        logging.warning(f'UNREADABLE AUDIO FILE {path}: {error}')
+        return None, None, None, None
+
+
+def read_all_track_info(directory, names, workers=None):
+    paths = [os.path.join(directory, name) for name in names]
+    if workers == 1:
+        return [read_track_info(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read_track_info, paths))
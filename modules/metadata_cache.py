@@ -0,0 +1,117 @@
+import logging
+import os
+import sqlite3
+
+CACHE_FILENAME = '_metadata.sqlite'
+
+
+class FileCache:
+    def __init__(self, directory, table, columns, cache_filename=CACHE_FILENAME):
+        self.path = os.path.join(directory, cache_filename)
+        self.table = table
+        self.columns = columns
+        self.connection = sqlite3.connect(self.path)
+        column_definitions = ', '.join(columns)
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} '
+                f'(filename TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, {column_definitions})'
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def load(self):
+        rows = self.connection.execute(f'SELECT filename, size, mtime, {", ".join(self.columns)} FROM {self.table}')
+        return {row[0]: (row[1], row[2], row[3:]) for row in rows}
+
+    def lookup(self, filename, size, mtime):
+        row = self.connection.execute(
+            f'SELECT {", ".join(self.columns)} FROM {self.table} WHERE filename = ? AND size = ? AND mtime = ?',
+            (filename, size, mtime)).fetchone()
+        return tuple(row) if row is not None else None
+
+    def store(self, entries):
+        placeholders = ', '.join('?' * (len(self.columns) + 3))
+        try:
+            with self.connection:
+                self.connection.executemany(f'INSERT OR REPLACE INTO {self.table} VALUES ({placeholders})', entries)
+        except sqlite3.Error as error:
+            logging.warning(f'{self.table.upper()} CACHE WRITE FAILED: {error}')
+
+    def prune(self, filenames):
+        try:
+            with self.connection:
+                self.connection.executemany(f'DELETE FROM {self.table} WHERE filename = ?',
+                                            ((filename,) for filename in filenames))
+        except sqlite3.Error as error:
+            logging.warning(f'{self.table.upper()} CACHE WRITE FAILED: {error}')
+
+    def refresh_stream(self, directory, entries, compute, workers=None, batch_size=500, prune=True):
+        cached = self.load()
+        seen = set()
+        hits, stale = [], []
+        hit_count = stale_count = 0
+        for name, size, mtime in entries:
+            seen.add(name)
+            if name in cached and cached[name][:2] == (size, mtime):
+                hits.append((name, cached[name][2]))
+                hit_count += 1
+                if len(hits) >= batch_size:
+                    yield hits
+                    hits = []
+            else:
+                stale.append((name, size, mtime))
+                stale_count += 1
+                if len(stale) >= batch_size:
+                    yield self._compute(directory, stale, compute, workers)
+                    stale = []
+        if hits:
+            yield hits
+        if stale:
+            yield self._compute(directory, stale, compute, workers)
+        removed = [name for name in cached if name not in seen] if prune else []
+        logging.info(f'{self.table.upper()} CACHE: {hit_count} HITS, {stale_count} STALE, {len(removed)} REMOVED')
+        if removed:
+            self.prune(removed)
+
+    def _compute(self, directory, stale, compute, workers):
+        computed = compute(directory, [name for name, _, _ in stale], workers)
+        self.store((*entry, *result) for entry, result in zip(stale, computed))
+        return [(entry[0], result) for entry, result in zip(stale, computed)]
+
+
+def stat_entries(directory, names):
+    for name in names:
+        stat = os.stat(os.path.join(directory, name))
+        yield name, stat.st_size, stat.st_mtime_ns
+
+
+def cached_refresh_stream(directory, table, columns, entries, compute, workers=None, batch_size=500, prune=True):
+    try:
+        cache = FileCache(directory, table, columns)
+    except sqlite3.Error as error:
+        logging.warning(f'{table.upper()} CACHE UNAVAILABLE ({error}): computing without cache')
+        chunk = []
+        for name, _, _ in entries:
+            chunk.append(name)
+            if len(chunk) >= batch_size:
+                yield list(zip(chunk, compute(directory, chunk, workers)))
+                chunk = []
+        if chunk:
+            yield list(zip(chunk, compute(directory, chunk, workers)))
+        return
+    with cache:
+        yield from cache.refresh_stream(directory, entries, compute, workers, batch_size, prune)
+
+
+def cached_refresh_batches(directory, table, columns, names, compute, workers=None, batch_size=500, prune=True):
+    yield from cached_refresh_stream(directory, table, columns, stat_entries(directory, names), compute, workers,
+                                     batch_size, prune)
+
@@ -0,0 +1,86 @@
+import bisect
+import re
+from collections import defaultdict
+
+FIELDS = ('anime', 'artist', 'title')
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN.findall(text.casefold()) if text else []
+
+
+def parse_query(text):
+    terms = []
+    for word in text.split():
+        field, _, value = word.rpartition(':')
+        field = field.casefold()
+        if field not in FIELDS:
+            field, value = None, word
+        terms.extend((field, token) for token in tokenize(value))
+    return terms
+
+
+class MetadataIndex:
+    def __init__(self, tracks=()):
+        self._names = []
+        self._ids = {}
+        self._postings = {field: defaultdict(set) for field in FIELDS}
+        self._sorted_tokens = {field: None for field in FIELDS}
+        for name, track in tracks:
+            self.add(name, track)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, name, track):
+        self.discard(name)
+        track_id = len(self._names)
+        self._names.append(name)
+        self._ids[name] = track_id
+        for field in FIELDS:
+            postings = self._postings[field]
+            for token in tokenize(track[field]):
+                if token not in postings:
+                    self._sorted_tokens[field] = None
+                postings[token].add(track_id)
+
+    def discard(self, name):
+        # postings keep the id, results skip ids whose name has been cleared
+        track_id = self._ids.pop(name, None)
+        if track_id is not None:
+            self._names[track_id] = None
+
+    def _tokens(self, field):
+        if self._sorted_tokens[field] is None:
+            self._sorted_tokens[field] = sorted(self._postings[field])
+        return self._sorted_tokens[field]
+
+    def _match(self, field, prefix):
+        tokens = self._tokens(field)
+        postings = self._postings[field]
+        start = bisect.bisect_left(tokens, prefix)
+        end = bisect.bisect_left(tokens, prefix + '\U0010ffff', start)
+        if end - start == 1:
+            return postings[tokens[start]]
+        matched = set()
+        for token in tokens[start:end]:
+            matched |= postings[token]
+        return matched
+
+    def query_ids(self, text):
+        result = None
+        # the rarest term goes first so the intersections shrink quickly
+        matches = [set().union(*(self._match(field, prefix) for field in FIELDS)) if field is None
+                   else self._match(field, prefix) for field, prefix in parse_query(text)]
+        for matched in sorted(matches, key=len):
+            result = matched.copy() if result is None else result & matched
+            if not result:
+                break
+        return result
+
+    def query(self, text):
+        ids = self.query_ids(text)
+        if ids is None:
+            return None
+        return {self._names[track_id] for track_id in ids if self._names[track_id] is not None}
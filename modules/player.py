@@ -1,28 +1,103 @@
 import logging
 import os
-import random
+import time
 
 from PyQt6.QtCore import QUrl
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 
+from modules import profiler
+from modules.profiler import profiled
+from modules.shuffle import Shuffle, pick_start
+
+TARGET_LUFS = -18.0
+
 
 class Player:
-    def __init__(self, audio_files, used, directory):
+    def __init__(self, audio_files, used, directory, durations=None, start_offsets=None, skip_start=0.0, skip_end=0.0,
+                 shuffle=None, session=None, clips=None, loudness=None):
         self.directory = directory
         self.audio_files = audio_files
+        self.shuffle = shuffle if shuffle is not None else Shuffle(audio_files)
+        self.session = session
+        self.clips = clips
+        self.clip_length = 0
         self.used = used
+        self.durations = durations if durations is not None else {}
+        self.start_offsets = start_offsets if start_offsets is not None else {}
+        self.loudness = loudness if loudness is not None else {}
+        self.fallback_loudness = None
+        self.skip_start = skip_start
+        self.skip_end = skip_end
         self.index = len(used)
         self.currently_played = None
+        self._loaded_track = None
+
+        self.media_player, self.audio_output = self._create_pipeline()
+        self._upcoming_player, self._upcoming_output = self._create_pipeline()
+        self._upcoming = None
+        self._pending_start = None
+        self._set_at = None
+        self._played_at = None
+        self._load_started_at = None
+        self._clip_origin = None
+        self._prepare_upcoming()
+
+    def _create_pipeline(self):
+        media_player = QMediaPlayer()
+        audio_output = QAudioOutput()
+        media_player.setAudioOutput(audio_output)
+        audio_output.setVolume(100)
+        media_player.mediaStatusChanged.connect(lambda status: self._media_status_changed(media_player, status))
+        media_player.positionChanged.connect(lambda position: self._position_changed(media_player, position))
+        return media_player, audio_output
+
+    def _prepare_upcoming(self, exclude=None):
+        self._upcoming = upcoming = self.shuffle.peek(self.used, exclude)
+        if upcoming is None:
+            return
+        self._upcoming_player.setSource(QUrl.fromLocalFile(os.path.join(self.directory, upcoming)))
+        if self.clips is not None:
+            self.clips.prefetch(upcoming)
+        logging.debug(f'UPCOMING MEDIA SET:{upcoming}')
 
-        self.media_player = QMediaPlayer()
-        self.audio_output = QAudioOutput()
-        self.media_player.setAudioOutput(self.audio_output)
-        self.audio_output.setVolume(100)
+    def set_filter(self, tracks):
+        self.shuffle.set_filter(tracks)
+        if self._upcoming is not None and tracks is not None and self._upcoming not in tracks:
+            self._prepare_upcoming(exclude=self._loaded_track)
 
+    def library_changed(self, removed_positions=()):
+        self.index -= sum(1 for position in removed_positions if position < self.index)
+        if self._upcoming not in self.audio_files:
+            self._prepare_upcoming(exclude=self._loaded_track)
+
+    @profiled('player.set_file')
     def set_file(self, track):
-        self.media_player.setSource(QUrl.fromLocalFile(os.path.join(self.directory, track)))
-        logging.info(f'MEDIA SET:{track}')
+        self._loaded_track = track
+        self._pending_start = None
+        self._clip_origin = None
+        self._set_at = time.perf_counter()
+        self._played_at = None
+        if track == self._upcoming:
+            self.media_player.stop()
+            self.media_player, self._upcoming_player = self._upcoming_player, self.media_player
+            self.audio_output, self._upcoming_output = self._upcoming_output, self.audio_output
+            logging.info(f'MEDIA SWAPPED IN:{track}')
+        else:
+            self._load_started_at = time.perf_counter()
+            self.media_player.setSource(QUrl.fromLocalFile(os.path.join(self.directory, track)))
+            logging.info(f'MEDIA SET:{track}')
+        self.audio_output.setVolume(self._volume(track))
+        if self._upcoming == track or self._upcoming not in self.audio_files:
+            self._prepare_upcoming(exclude=track)
+
+    def _volume(self, track):
+        lufs = self.loudness.get(track, self.fallback_loudness)
+        if lufs is None:
+            return 1.0
+        # QAudioOutput cannot amplify, so loud tracks are turned down to the target and quiet ones play at full volume
+        return min(1.0, 10 ** ((TARGET_LUFS - lufs) / 20))
 
+    @profiled('player.next')
     def next(self):
         try:
             logging.debug(f'NEXT_INDEX:{self.index}')
@@ -33,11 +108,38 @@ class Player:
             if len(self.audio_files) == 0:
                 logging.warning('NO NEXT TRACKS')
                 return None
-            next_track = random.choice(self.audio_files)
+            next_track = self._next_unclaimed() if self.session is not None else self.shuffle.next(self.used)
+            if next_track is None:
+                logging.warning('NO NEXT TRACKS MATCH THE FILTER')
+                return None
         logging.info(f'NEXT TRACK:{next_track}')
         self.currently_played = next_track
         return next_track
 
+    def claim(self):
+        track = self.currently_played
+        if self.session is None or track not in self.audio_files:
+            return True
+        if self.session.claim(track):
+            return True
+        # another host in the room played it between Next and Play
+        self.audio_files.discard(track)
+        logging.info(f'CLAIM LOST:{track} IN ROOM {self.session.room}')
+        return False
+
+    def _next_unclaimed(self):
+        taken = 0
+        next_track = self.shuffle.next(self.used)
+        while next_track is not None and self.session.is_claimed(next_track):
+            # played by another host in the same room; leaving the pool keeps the shuffle from offering it again
+            self.audio_files.discard(next_track)
+            taken += 1
+            next_track = self.shuffle.next(self.used)
+        if taken:
+            logging.info(f'SKIPPED {taken} TRACKS CLAIMED IN ROOM {self.session.room}')
+        return next_track
+
+    @profiled('player.previous')
     def previous(self):
         try:
             logging.debug(f'PREV_INDEX:{self.index}')
@@ -50,20 +152,91 @@ class Player:
         return previous_track
 
     def play_random(self):
-        random_start = random.choice(list(map(lambda num: num / 10, range(1, 9))) + [0.0, ])
-        self.play_from(random_start)
+        self._play(*pick_start(self.durations.get(self._loaded_track), self.start_offsets.get(self._loaded_track),
+                               self.skip_start, self.skip_end))
 
     def play_from(self, start):
+        self._play(start, None)
+
+    def _play(self, start, position):
         if self.currently_played in self.audio_files:
             self.audio_files.remove(self.currently_played)
             self.used.append(self.currently_played)
+        clip = self._load_clip(start, position) if self.clips is not None and self.clip_length > 0 else None
+        if clip is not None:
+            start, position = clip
+        elif self._clip_origin is not None:
+            self._load_track()
         if not self.media_player.source().isEmpty():
-            self.media_player.setPosition(int(start * self.media_player.duration()))
-            self.media_player.play()
+            self._played_at = time.perf_counter()
+            if self.media_player.mediaStatus() in (QMediaPlayer.MediaStatus.LoadedMedia,
+                                                   QMediaPlayer.MediaStatus.BufferingMedia,
+                                                   QMediaPlayer.MediaStatus.BufferedMedia,
+                                                   QMediaPlayer.MediaStatus.EndOfMedia):
+                self._start(start, position)
+            else:
+                logging.debug('MEDIA NOT LOADED YET: DEFERRING PLAY')
+                self._pending_start = (start, position)
+
+    def _load_clip(self, start, position):
+        duration = self.durations.get(self._loaded_track)
+        if position is None and not duration:
+            return None
+        position = position / 1000 if position is not None else start * duration
+        with profiler.span('player.clip'):
+            clip = self.clips.clip(self._loaded_track, position, self.clip_length)
+        if clip is None:
+            return None
+        path, lead_in = clip
+        source = QUrl.fromLocalFile(path)
+        if self.media_player.source() != source:
+            self._load_started_at = time.perf_counter()
+            self.media_player.setSource(source)
+            logging.debug(f'CLIP SET:{path}')
+        self._clip_origin = int(position * 1000) - lead_in
+        return 0.0, lead_in
+
+    def _load_track(self):
+        self._clip_origin = None
+        self._load_started_at = time.perf_counter()
+        self.media_player.setSource(QUrl.fromLocalFile(os.path.join(self.directory, self._loaded_track)))
+        logging.debug(f'MEDIA RESTORED:{self._loaded_track}')
+
+    def _start(self, start, position):
+        self._pending_start = None
+        with profiler.span('player.seek'):
+            self.media_player.setPosition(position if position is not None else
+                                          int(start * self.media_player.duration()))
+        self.media_player.play()
+
+    def _media_status_changed(self, media_player, status):
+        if media_player is self.media_player and self._load_started_at is not None \
+                and status == QMediaPlayer.MediaStatus.LoadedMedia:
+            profiler.record('player.media_load', time.perf_counter() - self._load_started_at)
+            self._load_started_at = None
+        if media_player is self.media_player and self._pending_start is not None \
+                and status == QMediaPlayer.MediaStatus.LoadedMedia:
+            self._start(*self._pending_start)
+
+    def _position_changed(self, media_player, position):
+        if media_player is self.media_player and self._played_at is not None and self.is_active():
+            now = time.perf_counter()
+            next_latency = f'{(now - self._set_at) * 1000:.1f} ms' if self._set_at is not None else '-'
+            logging.info(f'NEXT->AUDIBLE: {next_latency}, PLAY->AUDIBLE: {(now - self._played_at) * 1000:.1f} ms')
+            if self._set_at is not None:
+                profiler.record('player.next_to_audible', now - self._set_at)
+            profiler.record('player.play_to_audible', now - self._played_at)
+            self._set_at = None
+            self._played_at = None
 
     def pause_unpause(self):
         if self.media_player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
             self.media_player.pause()
+        elif self._clip_origin is not None:
+            # a clip only covers the countdown, so the answer plays on from the same spot in the full track
+            position = self._clip_origin + self.media_player.position()
+            self._load_track()
+            self._pending_start = (0.0, position)
         elif self.media_player.playbackState() == QMediaPlayer.PlaybackState.PausedState:
             self.media_player.play()
 
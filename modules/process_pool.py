@@ -0,0 +1,48 @@
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+
+class ProcessPool:
+    def __init__(self, workers=None):
+        # one pool serves every batch of a run; with a single worker the jobs run in the calling thread
+        self._executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+        self._cancelled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def map(self, function, items):
+        if self._executor is None:
+            results = []
+            for item in items:
+                self._check_cancelled()
+                results.append(function(item))
+            return results
+        self._check_cancelled()
+        try:
+            futures = [self._executor.submit(function, item) for item in items]
+        except RuntimeError:
+            # cancel shut the executor down between the check and the submit
+            self._check_cancelled()
+            raise
+        results = []
+        for future in futures:
+            # futures that had not started are cancelled by cancel(), so result() raises instead of waiting
+            results.append(future.result())
+            self._check_cancelled()
+        return results
+
+    def _check_cancelled(self):
+        if self._cancelled:
+            raise CancelledError()
+
+    def cancel(self):
+        self._cancelled = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
@@ -0,0 +1,76 @@
+import functools
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+_samples = None
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _samples[self.name].append(time.perf_counter() - self.start)
+
+
+def enable():
+    global _samples
+    _samples = defaultdict(list)
+
+
+def record(name, seconds):
+    if _samples is not None:
+        _samples[name].append(seconds)
+
+
+def span(name):
+    return _Span(name) if _samples is not None else _NULL_SPAN
+
+
+def profiled(name):
+    def decorator(fun):
+        @functools.wraps(fun)
+        def wrapper(*args, **kwargs):
+            if _samples is None:
+                return fun(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                _samples[name].append(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary():
+    result = {}
+    for name, samples in sorted((_samples or {}).items()):
+        ordered = sorted(samples)
+        result[name] = {
+            'count': len(ordered),
+            'p50_ms': _percentile(ordered, 0.50) * 1000,
+            'p95_ms': _percentile(ordered, 0.95) * 1000,
+            'max_ms': ordered[-1] * 1000,
+            'total_ms': sum(ordered) * 1000,
+        }
+    return result
+
+
+def dump(path):
+    with open(path, 'w', encoding='utf-8') as profilefile:
+        json.dump(summary(), profilefile, indent=2)
+    logging.info(f'PROFILE WRITTEN TO: {path}')
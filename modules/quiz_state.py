@@ -0,0 +1,57 @@
+QUIZ_FIELDS = {
+    'filename': '<>',
+    'anime': '<>',
+    'artist': '<>',
+    'title': '<>',
+    'count': '0/0',
+    'time': 0,
+    'counting': False,
+    'show_anime': False,
+    'show_artist': False,
+    'show_title': False,
+    'font_size': None,
+}
+
+
+class QuizState:
+    def __init__(self, schedule=None):
+        # schedule(fun) runs fun once on the next event loop cycle; without it, flush() is called by hand
+        self._schedule = schedule
+        self._values = dict(QUIZ_FIELDS)
+        self._rendered = dict(QUIZ_FIELDS)
+        self._changed = set()
+        self._scheduled = False
+        self._observers = []
+
+    def __getitem__(self, field):
+        return self._values[field]
+
+    def revealed(self, field):
+        return self._values[field] if self._values[f'show_{field}'] else ''
+
+    def subscribe(self, observer):
+        self._observers.append(observer)
+        observer(self, frozenset(self._values))
+
+    def update(self, **fields):
+        for field, value in fields.items():
+            if field not in self._values:
+                raise KeyError(field)
+            if self._values[field] != value:
+                self._values[field] = value
+                self._changed.add(field)
+        if self._changed and not self._scheduled and self._schedule is not None:
+            self._scheduled = True
+            self._schedule(self.flush)
+
+    def flush(self):
+        self._scheduled = False
+        # a field set and set back within one cycle is not repainted
+        changed = frozenset(field for field in self._changed if self._values[field] != self._rendered[field])
+        self._changed = set()
+        if not changed:
+            return
+        for field in changed:
+            self._rendered[field] = self._values[field]
+        for observer in self._observers:
+            observer(self, changed)
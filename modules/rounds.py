@@ -0,0 +1,105 @@
+import csv
+import json
+import logging
+import os
+import random
+import sqlite3
+
+from modules.metadata_cache import FileCache
+from modules.shuffle import pick_start
+
+ROUND_COLUMNS = ('round', 'number', 'filename', 'start', 'duration', 'anime', 'artist', 'title')
+
+
+def cached_start_offsets(directory):
+    # offsets analysed by an earlier --analyse session; nothing is decoded here
+    try:
+        with FileCache(directory, 'start_offsets', ['offsets TEXT']) as cache:
+            cached = cache.load()
+    except sqlite3.Error as error:
+        logging.warning(f'START_OFFSETS CACHE UNAVAILABLE ({error}): using random starts')
+        return {}
+    return {name: (size, mtime, tuple(int(offset) for offset in entry[0].split(',') if offset))
+            for name, (size, mtime, entry) in cached.items() if entry[0] is not None}
+
+
+def _fresh_offsets(directory, name, start_offsets):
+    cached = start_offsets.get(name)
+    if cached is None:
+        return None
+    try:
+        stat = os.stat(os.path.join(directory, name))
+    except OSError:
+        return None
+    return cached[2] if cached[:2] == (stat.st_size, stat.st_mtime_ns) else None
+
+
+def generate_rounds(library_handler, shuffle, rounds, size, random_start=False, start_offsets=None, skip_start=0.0,
+                    skip_end=0.0, rng=None):
+    start_offsets = start_offsets if start_offsets is not None else {}
+    rng = rng if rng is not None else random.Random(shuffle.seed)
+    pool, used = library_handler.audio_files, library_handler.used
+    for round_number in range(1, rounds + 1):
+        for number in range(1, size + 1):
+            track = shuffle.next(used)
+            if track is None:
+                logging.warning(f'NO TRACKS LEFT: ROUND {round_number} STOPPED AT {number - 1} TRACKS')
+                return
+            # same bookkeeping as Player._play, so the next pick sees the track as played
+            pool.remove(track)
+            used.append(track)
+            duration = library_handler.durations.get(track)
+            start = 0.0
+            if random_start:
+                fraction, position = pick_start(duration, _fresh_offsets(library_handler.directory, track,
+                                                                         start_offsets), skip_start, skip_end, rng)
+                start = position / 1000 if position is not None else fraction * duration if duration else None
+            info = library_handler[track]
+            yield {
+                'round': round_number,
+                'number': number,
+                'filename': track,
+                'start': start,
+                'duration': duration,
+                'anime': info['anime'],
+                'artist': info['artist'],
+                'title': info['title'],
+            }
+
+
+def write_csv(outfile, rows):
+    writer = csv.DictWriter(outfile, ROUND_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_json(outfile, rows):
+    # one array written element by element, so no round is ever held in memory
+    outfile.write('[')
+    separator = '\n'
+    for row in rows:
+        outfile.write(separator + json.dumps(row, ensure_ascii=False))
+        separator = ',\n'
+    outfile.write('\n]\n')
+
+
+def write_m3u(outfile, rows, directory=''):
+    outfile.write('#EXTM3U\n')
+    current_round = None
+    for row in rows:
+        if row['round'] != current_round:
+            current_round = row['round']
+            outfile.write(f'#EXTGRP:Round {current_round}\n')
+        duration = round(row['duration']) if row['duration'] else -1
+        outfile.write(f'#EXTINF:{duration},{row["artist"]} - {row["title"]} ({row["anime"]})\n')
+        if row['start']:
+            outfile.write(f'#EXTVLCOPT:start-time={row["start"]:.3f}\n')
+        outfile.write(os.path.join(directory, row['filename']) + '\n')
+
+
+EXPORTERS = {
+    'csv': write_csv,
+    'json': write_json,
+    'm3u': write_m3u,
+}
@@ -0,0 +1,47 @@
+import logging
+import os
+
+DEFAULT_EXTENSIONS = ('.mp3', '.ogg', '.opus', '.flac', '.m4a')
+
+
+def normalise_extensions(extensions):
+    return tuple('.' + extension.lower().lstrip('.') for extension in extensions)
+
+
+def scan_audio_files(directory, extensions=DEFAULT_EXTENSIONS, recursive=True):
+    extensions = normalise_extensions(extensions)
+    root = os.stat(directory)
+    visited = {(root.st_dev, root.st_ino)}
+    pending = [(directory, '')]
+    while pending:
+        path, prefix = pending.pop()
+        try:
+            with os.scandir(path) as entries:
+                subdirectories = []
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            if recursive:
+                                subdirectories.append(entry)
+                        elif entry.name.lower().endswith(extensions):
+                            stat = entry.stat()
+                            yield prefix + entry.name, stat.st_size, stat.st_mtime_ns
+                    except OSError as error:
+                        logging.warning(f'SCAN SKIPPED {entry.path}: {error}')
+        except OSError as error:
+            logging.warning(f'SCAN SKIPPED {path}: {error}')
+            continue
+        for entry in reversed(subdirectories):
+            try:
+                # follows symlinks, so a link back to an ancestor resolves to an already visited inode
+                stat = entry.stat()
+            except OSError as error:
+                logging.warning(f'SCAN SKIPPED {entry.path}: {error}')
+                continue
+            if (stat.st_dev, stat.st_ino) in visited:
+                logging.info(f'SCAN SKIPPED {entry.path}: directory already visited')
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+            pending.append((entry.path, f'{prefix}{entry.name}/'))
@@ -0,0 +1,79 @@
+import logging
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+
+SESSION_FILENAME = '_sessions.sqlite'
+
+
+class SessionStore:
+    def __init__(self, directory, room, session_filename=SESSION_FILENAME, timeout=30.0):
+        self.path = os.path.join(directory, session_filename)
+        self.room = room
+        self.host = f'{socket.gethostname()}:{os.getpid()}'
+        # autocommit mode, so every write takes the lock up front with BEGIN IMMEDIATE instead of upgrading later
+        self.connection = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self._write():
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS claims '
+                '(room TEXT NOT NULL, position INTEGER NOT NULL, filename TEXT NOT NULL, host TEXT, claimed_at REAL, '
+                'PRIMARY KEY (room, filename))'
+            )
+            self.connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS claims_order ON claims (room, position)')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @contextmanager
+    def _write(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def load(self):
+        rows = self.connection.execute('SELECT filename FROM claims WHERE room = ? ORDER BY position', (self.room,))
+        used = [row[0] for row in rows]
+        logging.info(f'FOUND {len(used)} USED ENTRIES IN ROOM {self.room}')
+        return used
+
+    def _next_position(self):
+        row = self.connection.execute('SELECT MAX(position) FROM claims WHERE room = ?', (self.room,)).fetchone()
+        return (row[0] or 0) + 1
+
+    def append(self, entries):
+        entries = list(entries)
+        if not entries:
+            return 0
+        inserted = 0
+        with self._write():
+            position = self._next_position()
+            for entry in entries:
+                cursor = self.connection.execute(
+                    'INSERT OR IGNORE INTO claims VALUES (?, ?, ?, ?, ?)',
+                    (self.room, position + inserted, entry, self.host, time.time()))
+                inserted += cursor.rowcount
+        return inserted
+
+    def claim(self, filename):
+        # the insert and its check share one write transaction, so of two hosts taking a track only one gets it
+        return self.append([filename]) == 1
+
+    def is_claimed(self, filename):
+        # a plain read to skip tracks played elsewhere; only claim decides who gets a track
+        row = self.connection.execute('SELECT 1 FROM claims WHERE room = ? AND filename = ?',
+                                      (self.room, filename)).fetchone()
+        return row is not None
@@ -0,0 +1,137 @@
+import heapq
+import logging
+import math
+import random
+from collections import Counter, defaultdict, deque
+
+RANDOM_STARTS = tuple(num / 10 for num in range(1, 9)) + (0.0,)
+
+
+def pick_start(duration, start_offsets, skip_start=0.0, skip_end=0.0, rng=random):
+    # returns (fraction of the track, position in ms); the position wins when it is known
+    start_offsets = [offset for offset in start_offsets or ()
+                     if offset >= skip_start * 1000 and (not duration or offset <= (duration - skip_end) * 1000)]
+    if start_offsets:
+        return 0.0, rng.choice(start_offsets)
+    random_start = rng.choice(RANDOM_STARTS)
+    window = duration - skip_start - skip_end if duration else 0
+    if window > 0:
+        return 0.0, int((skip_start + random_start * window) * 1000)
+    return random_start, None
+
+
+def shuffle_order(tracks, rng, group=None, spacing=0, weight=None, recent=()):
+    # weighted random permutation (Efraimidis-Spirakis): heavier tracks tend to come first
+    keys = {}
+    for track in tracks:
+        track_weight = weight(track) if weight is not None else 1.0
+        keys[track] = math.log(1.0 - rng.random()) / track_weight if track_weight > 0 else -math.inf
+    ordered = sorted(tracks, key=keys.__getitem__, reverse=True)
+    if group is None or spacing <= 0:
+        return ordered
+
+    rank = {track: position for position, track in enumerate(ordered)}
+    queues = defaultdict(deque)
+    for track in ordered:
+        key = group(track)
+        queues[key if key is not None else (None, track)].append(track)
+    recent = list(recent)[-spacing:]
+    released_at = {key: step + spacing + 1 for step, key in enumerate(recent, start=-len(recent))}
+    available = []
+    waiting = []
+    for key, queue in queues.items():
+        if released_at.get(key, 0) > 0:
+            heapq.heappush(waiting, (released_at[key], rank[queue[0]], key))
+        else:
+            heapq.heappush(available, (rank[queue[0]], key))
+
+    order = []
+    for step in range(len(ordered)):
+        while waiting and waiting[0][0] <= step:
+            _, head, key = heapq.heappop(waiting)
+            heapq.heappush(available, (head, key))
+        if available:
+            _, key = heapq.heappop(available)
+        else:
+            # every remaining group is still spaced out: take the one released soonest
+            _, _, key = heapq.heappop(waiting)
+        queue = queues[key]
+        order.append(queue.popleft())
+        if queue:
+            heapq.heappush(waiting, (step + spacing + 1, rank[queue[0]], key))
+    return order
+
+
+class Shuffle:
+    def __init__(self, pool, library=None, seed=None, spacing=0, spacing_column='anime', weight_column=None):
+        self.pool = pool
+        self.library = library
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.spacing = spacing
+        self.spacing_column = spacing_column
+        self.weight_column = weight_column
+        self.filter = None
+        self._order = []
+        self._cursor = 0
+        self._generation = 0
+        self._pool_additions = None
+
+    def renew(self, pool, library):
+        return Shuffle(pool, library, self.seed, self.spacing, self.spacing_column, self.weight_column)
+
+    def set_filter(self, tracks):
+        self.filter = tracks
+        self._pool_additions = None
+
+    def _playable(self, track):
+        return track in self.pool and (self.filter is None or track in self.filter)
+
+    def _column(self, track, column):
+        try:
+            return self.library[track][column]
+        except (KeyError, TypeError, AttributeError):
+            return None
+
+    def _rebuild(self, recent):
+        tracks = sorted(self.pool if self.filter is None else (track for track in self.pool if track in self.filter))
+        rng = random.Random(f'{self.seed}/{self._generation}')
+        weight = None
+        if self.weight_column is not None:
+            # every value of the column gets the same total weight, so big groups do not crowd out small ones
+            counts = Counter(self._column(track, self.weight_column) for track in tracks)
+            weight = lambda track: 1.0 / counts[self._column(track, self.weight_column)]
+        group = (lambda track: self._column(track, self.spacing_column)) if self.spacing > 0 else None
+        recent_groups = [self._column(track, self.spacing_column) for track in recent[-self.spacing:]] \
+            if self.spacing > 0 else ()
+        self._order = shuffle_order(tracks, rng, group, self.spacing, weight, recent_groups)
+        self._cursor = 0
+        self._pool_additions = self.pool.additions
+        logging.info(f'SHUFFLE ORDER BUILT: {len(tracks)} TRACKS, SEED {self.seed}, GENERATION {self._generation}')
+        self._generation += 1
+
+    def _advance(self, recent):
+        if self._pool_additions != self.pool.additions:
+            self._rebuild(recent)
+        while self._cursor < len(self._order) and not self._playable(self._order[self._cursor]):
+            self._cursor += 1
+        if self._cursor == len(self._order):
+            self._rebuild(recent)
+        return self._cursor < len(self._order)
+
+    def peek(self, recent=(), exclude=None):
+        if len(self.pool) == 0 or not self._advance(recent):
+            return None
+        cursor = self._cursor
+        while cursor < len(self._order):
+            track = self._order[cursor]
+            if self._playable(track) and track != exclude:
+                return track
+            cursor += 1
+        return None
+
+    def next(self, recent=()):
+        if len(self.pool) == 0 or not self._advance(recent):
+            return None
+        track = self._order[self._cursor]
+        self._cursor += 1
+        return track
@@ -1,26 +1,52 @@
-from PyQt6.QtCore import QTimer
+import math
+import time
+
+from PyQt6.QtCore import QTimer, Qt
+
+TICK_INTERVAL = 100
 
 
 class StopWatch:
-    def __init__(self, timeout):
+    def __init__(self, timeout, clock=time.monotonic):
+        self._clock = clock
         self._secret_timer = QTimer()
+        self._timeout_timer = QTimer()
         self._initial_time: int = timeout
+        self._remaining: float = timeout
+        self._deadline = None
         self.time = self._initial_time
         self._timeout_fun = lambda: None
         self._tick_fun = lambda: None
         self._secret_timer.timeout.connect(self._tick)
         self._secret_timer.setSingleShot(False)
+        self._timeout_timer.timeout.connect(self._timeout)
+        self._timeout_timer.setSingleShot(True)
+        self._timeout_timer.setTimerType(Qt.TimerType.PreciseTimer)
 
     def start(self):
-        self._secret_timer.start(1000)
+        if self._deadline is not None or self._remaining <= 0:
+            return
+        self._deadline = self._clock() + self._remaining
+        self._timeout_timer.start(math.ceil(self._remaining * 1000))
+        self._secret_timer.start(TICK_INTERVAL)
 
     def stop(self):
+        if self._deadline is not None:
+            self._remaining = max(0.0, self._deadline - self._clock())
+            self._deadline = None
         self._secret_timer.stop()
+        self._timeout_timer.stop()
 
     def reset(self):
         self.stop()
+        self._remaining = self._initial_time
         self.time = self._initial_time
 
+    def remaining(self):
+        if self._deadline is None:
+            return self._remaining
+        return max(0.0, self._deadline - self._clock())
+
     def connect_timeout_fun(self, fun):
         self._timeout_fun = fun
 
@@ -29,11 +55,28 @@ class StopWatch:
 
     def set_time(self, time):
         self._initial_time = time
+        self._remaining = time
         self.time = time
 
     def _tick(self):
-        self.time = self.time - 1
-        self._tick_fun()
-        if self.time == 0:
-            self._timeout_fun()
-            self._secret_timer.stop()
+        remaining = self.remaining()
+        if remaining <= 0:
+            self._timeout()
+            return
+        displayed = math.ceil(remaining)
+        if displayed != self.time:
+            self.time = displayed
+            self._tick_fun()
+
+    def _timeout(self):
+        # the single shot may fire a hair early relative to the monotonic clock, re-arm for the rest
+        remaining = self.remaining()
+        if remaining > 0.001:
+            self._timeout_timer.start(math.ceil(remaining * 1000))
+            return
+        self.stop()
+        self._remaining = 0.0
+        if self.time != 0:
+            self.time = 0
+            self._tick_fun()
+        self._timeout_fun()
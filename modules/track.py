@@ -0,0 +1,13 @@
+class Track:
+    __slots__ = ('artist', 'title', 'anime')
+
+    def __init__(self, artist, title, anime):
+        self.artist = artist
+        self.title = title
+        self.anime = anime
+
+    def __getitem__(self, column):
+        return getattr(self, column)
+
+    def __repr__(self):
+        return f'Track(artist={self.artist!r}, title={self.title!r}, anime={self.anime!r})'
@@ -0,0 +1,39 @@
+import random
+
+
+class TrackPool:
+    def __init__(self, tracks=()):
+        self._tracks = []
+        self._positions = {}
+        self.additions = 0
+        for track in tracks:
+            self.add(track)
+
+    def __contains__(self, track):
+        return track in self._positions
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __iter__(self):
+        return iter(self._tracks)
+
+    def add(self, track):
+        if track not in self._positions:
+            self._positions[track] = len(self._tracks)
+            self._tracks.append(track)
+            self.additions += 1
+
+    def remove(self, track):
+        position = self._positions.pop(track)
+        last = self._tracks.pop()
+        if position < len(self._tracks):
+            self._tracks[position] = last
+            self._positions[last] = position
+
+    def discard(self, track):
+        if track in self._positions:
+            self.remove(track)
+
+    def choice(self, rng=random):
+        return rng.choice(self._tracks)
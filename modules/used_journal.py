@@ -0,0 +1,78 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+USED_FILENAME = '_used.txt'
+JOURNAL_FILENAME = '_used.journal'
+
+
+def replay_journal(directory, used, journal_filename=JOURNAL_FILENAME):
+    try:
+        with open(os.path.join(directory, journal_filename), encoding='utf-8') as journal:
+            content = journal.read()
+    except FileNotFoundError:
+        return used
+    entries = content.split('\n')
+    # the last entry is either empty or a line torn by a crash mid-write
+    entries.pop()
+    seen = set(used)
+    replayed = [entry for entry in entries if entry and entry not in seen and not seen.add(entry)]
+    logging.info(f'REPLAYED {len(replayed)} ENTRIES FROM USED JOURNAL')
+    return used + replayed
+
+
+class UsedJournal:
+    def __init__(self, directory, fsync_batch=16, fsync_interval=2.0,
+                 used_filename=USED_FILENAME, journal_filename=JOURNAL_FILENAME):
+        self.used_path = os.path.join(directory, used_filename)
+        self.journal_path = os.path.join(directory, journal_filename)
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='used-journal', daemon=True)
+        self._thread.start()
+
+    def append(self, entries):
+        self._queue.put(list(entries))
+
+    def close(self, used):
+        self._queue.put(None)
+        self._thread.join()
+        self._compact(used)
+
+    def _run(self):
+        with open(self.journal_path, 'a', encoding='utf-8') as journal:
+            unsynced = 0
+            sync_deadline = None
+            while True:
+                timeout = max(0.0, sync_deadline - time.monotonic()) if unsynced else None
+                try:
+                    entries = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    entries = []
+                if entries is None:
+                    break
+                if entries:
+                    journal.write(''.join(f'{entry}\n' for entry in entries))
+                    journal.flush()
+                    if not unsynced:
+                        sync_deadline = time.monotonic() + self.fsync_interval
+                    unsynced += len(entries)
+                if unsynced and (unsynced >= self.fsync_batch or time.monotonic() >= sync_deadline):
+                    os.fsync(journal.fileno())
+                    logging.debug(f'USED JOURNAL SYNCED {unsynced} ENTRIES')
+                    unsynced = 0
+            if unsynced:
+                os.fsync(journal.fileno())
+
+    def _compact(self, used):
+        temporary_path = f'{self.used_path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as usedfile:
+            logging.info(f'COMPACTING {len(used)} ENTRIES TO USED')
+            usedfile.write("\n".join(used))
+            usedfile.flush()
+            os.fsync(usedfile.fileno())
+        os.replace(temporary_path, self.used_path)
+        os.remove(self.journal_path)
@@ -3,24 +3,64 @@ import datetime
 import logging
 import os
 import sys
+import time
 
 from PyQt6.QtWidgets import QApplication
 
+from modules import profiler
+from modules.broadcast import BroadcastServer
+from modules.clip_cache import ClipCache
 from modules.controller import ControllerWindow
 from modules.library import LibraryHandler
 from modules.player import Player
+from modules.scanner import DEFAULT_EXTENSIONS
+from modules.shuffle import Shuffle
 
 
 class Application:
-    def __init__(self, directory, do_not_write_used, library_filename, get_all):
+    def __init__(self, directory, do_not_write_used, library_filename, get_all, workers, journal, skip_start, skip_end,
+                 analyse, extensions, watch, seed, spacing, spacing_column, weight_by, room, broadcast=None,
+                 dedupe=False, clips=None, normalise=False, profile=None):
+        self.profile = profile
+        self._created_at = time.perf_counter()
         self.qapp = QApplication([])
-        self.library_parser = LibraryHandler(directory, library_filename, get_all)
-        self.player = Player(self.library_parser.audio_files, self.library_parser.used, directory)
-        self.window = ControllerWindow(directory, self.player, self.library_parser, do_not_write_used)
+        self.library_parser = LibraryHandler(directory, library_filename, get_all, workers,
+                                             journal and not do_not_write_used, extensions,
+                                             room if not do_not_write_used else None, load=False)
+        shuffle = Shuffle(self.library_parser.audio_files, self.library_parser, seed, spacing, spacing_column,
+                          weight_by)
+        # above the default log level, a generated seed is the only way to replay the session
+        logging.warning(f'SHUFFLE SEED: {shuffle.seed}')
+        self.player = Player(self.library_parser.audio_files, self.library_parser.used, directory,
+                             self.library_parser.durations, self.library_parser.start_offsets, skip_start, skip_end,
+                             shuffle, self.library_parser.session,
+                             ClipCache(directory, int(clips * (1 << 20))) if clips else None,
+                             self.library_parser.loudness)
+        self.broadcaster = self._start_broadcaster(broadcast) if broadcast else None
+        self.window = ControllerWindow(directory, self.player, self.library_parser, do_not_write_used, analyse,
+                                       watch, self.broadcaster, dedupe, normalise)
+        self.window.load_library(self.library_parser)
+
+    @staticmethod
+    def _start_broadcaster(address):
+        host, _, port = address.rpartition(':')
+        broadcaster = BroadcastServer(host or '0.0.0.0', int(port))
+        try:
+            broadcaster.start()
+        except OSError as error:
+            logging.error(f'BROADCAST SERVER FAILED TO START: {error}')
+            return None
+        return broadcaster
 
     def run(self):
         self.window.show()
-        sys.exit(self.qapp.exec())
+        profiler.record('app.init_to_window_shown', time.perf_counter() - self._created_at)
+        exit_code = self.qapp.exec()
+        if self.broadcaster is not None:
+            self.broadcaster.stop()
+        if self.profile:
+            profiler.dump(self.profile)
+        sys.exit(exit_code)
 
 
 if __name__ == "__main__":
@@ -34,6 +74,44 @@ if __name__ == "__main__":
     parser.add_argument('--noused', action='store_true', default=False, help='ignore used file')
     parser.add_argument('--pick', action='store_true', default=False,
                         help='load only selected entries from library, using "taken"')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of parallel workers reading tags when library file is missing')
+    parser.add_argument('--journal', action='store_true', default=False,
+                        help='append used entries to a journal in the background, compacting it on exit')
+    parser.add_argument('--skip-start', type=float, default=0.0,
+                        help='seconds at the start of a track never picked as a random start')
+    parser.add_argument('--skip-end', type=float, default=0.0,
+                        help='seconds at the end of a track never picked as a random start')
+    parser.add_argument('--analyse', action='store_true', default=False,
+                        help='analyse audio energy in the background to pick non-silent random starts')
+    parser.add_argument('--extensions', nargs='+', default=list(DEFAULT_EXTENSIONS),
+                        help='audio file extensions picked up while scanning the directory tree')
+    parser.add_argument('--watch', action='store_true', default=False,
+                        help='pick up added, removed and edited tracks and library file changes while running')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the round order, logged on start so a session can be replayed')
+    parser.add_argument('--spacing', type=int, default=0,
+                        help='minimum number of tracks between two tracks sharing the spacing column value')
+    parser.add_argument('--spacing-column', default='anime', choices=['anime', 'artist', 'title'],
+                        help='library column the spacing applies to')
+    parser.add_argument('--weight-by', default=None, choices=['anime', 'artist', 'title'],
+                        help='give every value of this library column the same chance, whatever its track count')
+    parser.add_argument('--room', default=None,
+                        help='share used tracks with other instances in this room through a SQLite store in the '
+                             'music directory instead of _used.txt')
+    parser.add_argument('--broadcast', metavar='[HOST:]PORT', default=None,
+                        help='push track count, countdown and revealed track info to remote screens over TCP '
+                             '(JSON lines) or WebSocket')
+    parser.add_argument('--dedupe', action='store_true', default=False,
+                        help='hash audio payloads in the background and keep one copy of each duplicated track in '
+                             'the round, writing what was merged to _duplicates.csv')
+    parser.add_argument('--clips', metavar='MB', type=float, nargs='?', const=256.0, default=None,
+                        help='play MP3s from clips cut at frame boundaries around the start offset, kept in .clips in '
+                             'the music directory up to this size')
+    parser.add_argument('--normalise', action='store_true', default=False,
+                        help='measure track loudness in the background and turn loud tracks down to an even level')
+    parser.add_argument('--profile', nargs='?', const='', default=None,
+                        help='record latency histograms of hot paths and dump them to this JSON file on exit')
     args = parser.parse_args()
 
     logging.basicConfig(level={
@@ -52,5 +130,12 @@ if __name__ == "__main__":
         fileLogHandler.setFormatter(fileLogFormatter)
         logging.getLogger().addHandler(fileLogHandler)
 
-    app = Application(args.dir, args.noused, args.library, args.all)
+    if args.profile is not None:
+        profiler.enable()
+        args.profile = args.profile or f'opedquiz_profile_{datetime.datetime.now().strftime("%Y%m%dT%H%M%S")}.json'
+    app = Application(args.dir, args.noused, args.library, not args.pick, args.workers, args.journal,
+                      args.skip_start, args.skip_end, args.analyse, args.extensions, args.watch,
+                      args.seed, args.spacing, args.spacing_column, args.weight_by, args.room,
+                      args.broadcast, args.dedupe, args.clips, args.normalise,
+                      args.profile)
     app.run()
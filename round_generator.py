@@ -0,0 +1,80 @@
+import argparse
+import logging
+import os
+import sys
+from functools import partial
+
+from modules.library import LibraryHandler
+from modules.rounds import EXPORTERS, cached_start_offsets, generate_rounds, write_m3u
+from modules.scanner import DEFAULT_EXTENSIONS
+from modules.shuffle import Shuffle
+
+
+def export_format(output, requested):
+    if requested is not None:
+        return requested
+    extension = os.path.splitext(output or '')[1].lower().lstrip('.')
+    return extension if extension in EXPORTERS else 'csv'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser('Generate OPED quiz rounds without the GUI')
+    parser.add_argument('--dir', default=os.getcwd(), help='directory with music library')
+    parser.add_argument('--library', default='_library.csv', help='name of library file')
+    parser.add_argument('--log', default='warn', choices=['debug', 'info', 'warn', 'error', 'critical'],
+                        help='logging level')
+    parser.add_argument('--pick', action='store_true', default=False,
+                        help='load only selected entries from library, using "taken"')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of parallel workers reading tags when library file is missing')
+    parser.add_argument('--extensions', nargs='+', default=list(DEFAULT_EXTENSIONS),
+                        help='audio file extensions picked up while scanning the directory tree')
+    parser.add_argument('--rounds', type=int, default=1, help='number of rounds to generate')
+    parser.add_argument('--size', type=int, default=20, help='tracks per round')
+    parser.add_argument('--random-start', action='store_true', default=False,
+                        help='pick a start offset per track like the "Random Start" checkbox does')
+    parser.add_argument('--skip-start', type=float, default=0.0,
+                        help='seconds at the start of a track never picked as a random start')
+    parser.add_argument('--skip-end', type=float, default=0.0,
+                        help='seconds at the end of a track never picked as a random start')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the round order and start offsets, logged so the rounds can be regenerated')
+    parser.add_argument('--spacing', type=int, default=0,
+                        help='keep at least this many other tracks between two tracks of the same spacing column')
+    parser.add_argument('--spacing-column', default='anime', choices=['anime', 'artist', 'title'],
+                        help='library column the spacing applies to')
+    parser.add_argument('--weight-by', default=None, choices=['anime', 'artist', 'title'],
+                        help='give every value of this library column the same chance, whatever its track count')
+    parser.add_argument('--output', default=None, help='file to write the rounds to (else they go to stdout)')
+    parser.add_argument('--format', default=None, choices=sorted(EXPORTERS),
+                        help='export format, guessed from the output file extension when not given')
+    parser.add_argument('--mark-used', action='store_true', default=False,
+                        help='add the generated tracks to _used.txt in one write once all rounds are out')
+    args = parser.parse_args()
+
+    logging.basicConfig(level={
+        'debug': logging.DEBUG,
+        'info': logging.INFO,
+        'warn': logging.WARN,
+        'error': logging.ERROR,
+        'critical': logging.CRITICAL
+    }[args.log], stream=sys.stderr)
+
+    library_handler = LibraryHandler(args.dir, args.library, not args.pick, args.workers,
+                                     extensions=args.extensions)
+    shuffle = Shuffle(library_handler.audio_files, library_handler, args.seed, args.spacing, args.spacing_column,
+                      args.weight_by)
+    logging.warning(f'GENERATING {args.rounds} ROUNDS OF {args.size} TRACKS, SEED {shuffle.seed}')
+    start_offsets = cached_start_offsets(args.dir) if args.random_start else {}
+    rows = generate_rounds(library_handler, shuffle, args.rounds, args.size, args.random_start, start_offsets,
+                           args.skip_start, args.skip_end)
+    export_as = export_format(args.output, args.format)
+    exporter = partial(write_m3u, directory=os.path.abspath(args.dir)) if export_as == 'm3u' else EXPORTERS[export_as]
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as outfile:
+            exporter(outfile, rows)
+    else:
+        exporter(sys.stdout, rows)
+    if args.mark_used:
+        library_handler.write_used()
+    library_handler.close()
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+from modules import library_index
+from modules.library_index import INDEX_SUFFIX, CompiledIndex, open_library_index
+
+ROWS = [
+    ('filename', 'artist', 'title', 'anime', 'take'),
+    ('a.mp3', 'Aimer', 'Brave Shine', 'Fate', 'x'),
+    ('b.mp3', 'LiSA', 'Gurenge', 'Kimetsu', ''),
+    ('c.mp3', 'Skipped', 'Song', 'pass', 'x'),
+    ('d.mp3', 'Missing', '', 'Anime', 'x'),
+    ('ü.mp3', 'Yōko Kanno', 'Tank!', 'Cowboy Bebop', ''),
+    ('b.mp3', 'LiSA', 'Homura', 'Kimetsu', 'x'),
+]
+
+
+def write_csv(path, rows):
+    path.write_text(''.join(','.join(row) + '\n' for row in rows), encoding='utf-8')
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / '_library.csv'
+    write_csv(path, ROWS)
+    return path
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    calls = []
+    build_index = library_index.build_index
+
+    def counting_build_index(*args):
+        calls.append(args[0])
+        build_index(*args)
+    monkeypatch.setattr(library_index, 'build_index', counting_build_index)
+    return calls
+
+
+def open_index(csv_path, get_all=True):
+    index = open_library_index(str(csv_path), get_all)
+    assert isinstance(index, CompiledIndex)
+    return index
+
+
+def test_round_trip(csv_path):
+    index = open_index(csv_path)
+    try:
+        # pass rows and rows with empty cells are left out, a repeated filename keeps its last row
+        assert len(index) == 3
+        assert dict((name, (track.artist, track.title, track.anime)) for name, track in index.items()) == {
+            'a.mp3': ('Aimer', 'Brave Shine', 'Fate'),
+            'b.mp3': ('LiSA', 'Homura', 'Kimetsu'),
+            'ü.mp3': ('Yōko Kanno', 'Tank!', 'Cowboy Bebop'),
+        }
+        assert index['ü.mp3']['artist'] == 'Yōko Kanno'
+        assert 'c.mp3' not in index and 'd.mp3' not in index
+        assert index.get('missing.mp3') is None
+        with pytest.raises(KeyError):
+            index['c.mp3']
+    finally:
+        index.close()
+
+
+def test_take_only(csv_path):
+    index = open_index(csv_path, get_all=False)
+    try:
+        assert len(index) == 2
+        assert sorted(name for name, _ in index.items()) == ['a.mp3', 'b.mp3']
+        assert 'ü.mp3' not in index
+    finally:
+        index.close()
+
+
+def test_index_is_reused(csv_path, builds):
+    open_index(csv_path).close()
+    open_index(csv_path).close()
+    assert len(builds) == 1
+    assert sorted(os.listdir(csv_path.parent)) == ['_library.csv', f'_library.csv{INDEX_SUFFIX}']
+
+
+def test_edited_csv_rebuilds_the_index(csv_path, builds):
+    open_index(csv_path).close()
+    write_csv(csv_path, ROWS[:2] + [('e.mp3', 'New', 'Entry', 'Anime', '')])
+    index = open_index(csv_path)
+    try:
+        assert len(builds) == 2
+        assert sorted(name for name, _ in index.items()) == ['a.mp3', 'e.mp3']
+    finally:
+        index.close()
+
+
+def test_touched_csv_keeps_the_index(csv_path, builds, monkeypatch):
+    open_index(csv_path).close()
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    hashes = []
+    hash_file = library_index._hash_file
+    monkeypatch.setattr(library_index, '_hash_file', lambda path: hashes.append(path) or hash_file(path))
+    open_index(csv_path).close()
+    open_index(csv_path).close()
+    # the new mtime is stamped into the index, so only the first open after the touch hashes the CSV
+    assert len(builds) == 1
+    assert len(hashes) == 1
+
+
+def test_damaged_index_is_rebuilt(csv_path, builds):
+    open_index(csv_path).close()
+    with open(f'{csv_path}{INDEX_SUFFIX}', 'r+b') as indexfile:
+        indexfile.write(b'JUNK')
+    index = open_index(csv_path)
+    try:
+        assert len(builds) == 2
+        assert index['a.mp3'].title == 'Brave Shine'
+    finally:
+        index.close()
@@ -0,0 +1,139 @@
+import pytest
+
+from modules.metadata import index_frames, read_duration, read_tags
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 byte frames of 1152 samples
+STEREO_HEADER = b'\xff\xfb\x90\x00'
+MONO_HEADER = b'\xff\xfb\x90\xc0'
+FRAME_SIZE = 417
+FRAME_SECONDS = 1152 / 44100
+
+
+def syncsafe(size):
+    return bytes(((size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F))
+
+
+def text(value, encoding=3):
+    return bytes((encoding,)) + value.encode({0: 'latin-1', 1: 'utf-16', 3: 'utf-8'}[encoding])
+
+
+def frame(version, frame_id, data, flags=0):
+    if version == 2:
+        return frame_id + len(data).to_bytes(3, 'big') + data
+    size = len(data).to_bytes(4, 'big') if version == 3 else syncsafe(len(data))
+    return frame_id + size + flags.to_bytes(2, 'big') + data
+
+
+def tag(version, body, flags=0):
+    return b'ID3' + bytes((version, 0, flags)) + syncsafe(len(body)) + body
+
+
+def id3v1(artist, title, album):
+    return b'TAG' + title.encode().ljust(30, b'\x00') + artist.encode().ljust(30, b'\x00') + \
+        album.encode().ljust(30, b'\x00') + b'\x00' * 35
+
+
+def audio_frame(header=STEREO_HEADER):
+    return header + b'\x00' * (FRAME_SIZE - 4)
+
+
+def xing_frame(frames, header=STEREO_HEADER):
+    side_info = 17 if header == MONO_HEADER else 32
+    data = header + b'\x00' * side_info + b'Xing' + b'\x00\x00\x00\x01' + frames.to_bytes(4, 'big')
+    return data.ljust(FRAME_SIZE, b'\x00')
+
+
+def vbri_frame(frames):
+    data = STEREO_HEADER + b'\x00' * 32 + b'VBRI' + b'\x00' * 10 + frames.to_bytes(4, 'big')
+    return data.ljust(FRAME_SIZE, b'\x00')
+
+
+@pytest.fixture
+def write(tmp_path):
+    def write(data, name='track.mp3'):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+
+def test_id3v22_tags(write):
+    body = frame(2, b'TP1', text('Artist')) + frame(2, b'TT2', text('Title')) + frame(2, b'TAL', text('Album'))
+    assert read_tags(write(tag(2, body) + audio_frame())) == ('Artist', 'Title', 'Album')
+
+
+def test_id3v23_skips_frames_it_does_not_need(write):
+    body = frame(3, b'APIC', b'\x00' * 300_000) + frame(3, b'TIT2', text('Title', 1)) + \
+        frame(3, b'TPE1', text('Artist', 0)) + frame(3, b'TALB', text('Album'))
+    assert read_tags(write(tag(3, body) + audio_frame())) == ('Artist', 'Title', 'Album')
+
+
+def test_id3v24_syncsafe_sizes_and_frame_unsynchronisation(write):
+    # 200 bytes makes the syncsafe size differ from a plain big-endian one
+    artist = 'A' * 199
+    album = b'\x00Alb\xff\x00um'
+    body = frame(4, b'TPE1', text(artist)) + frame(4, b'TIT2', text('One\x00Two')) + \
+        frame(4, b'TALB', album, flags=0x0002)
+    assert read_tags(write(tag(4, body) + audio_frame())) == (artist, 'One', 'Alb\xffum')
+
+
+def test_id3v23_tag_unsynchronisation(write):
+    # a 255 byte frame puts 0xFF into the size field, so the tag only parses once it is resynchronised
+    artist = '\xff' * 254
+    body = frame(3, b'TPE1', text(artist, 0)) + frame(3, b'TIT2', text('Title')) + frame(3, b'TALB', text('Album'))
+    unsynchronised = body.replace(b'\xff', b'\xff\x00')
+    assert read_tags(write(tag(3, unsynchronised, flags=0x80) + audio_frame())) == (artist, 'Title', 'Album')
+
+
+@pytest.mark.parametrize('version, extended', [
+    (3, b'\x00\x00\x00\x06' + b'\x00' * 6),
+    (4, syncsafe(6) + b'\x01\x00'),
+])
+def test_extended_header_is_skipped(write, version, extended):
+    body = extended + frame(version, b'TPE1', text('Artist')) + frame(version, b'TIT2', text('Title'))
+    assert read_tags(write(tag(version, body, flags=0x40) + audio_frame())) == ('Artist', 'Title', None)
+
+
+def test_id3v2_without_wanted_frames_falls_back_to_id3v1(write):
+    data = tag(3, frame(3, b'COMM', text('comment'))) + audio_frame() + id3v1('Artist', 'Title', 'Album')
+    assert read_tags(write(data)) == ('Artist', 'Title', 'Album')
+
+
+def test_cbr_duration_excludes_tags(write):
+    data = tag(3, frame(3, b'TIT2', text('Title'))) + audio_frame() * 100 + id3v1('Artist', 'Title', 'Album')
+    assert read_duration(write(data)) == pytest.approx(100 * FRAME_SIZE * 8 / 128000)
+
+
+@pytest.mark.parametrize('header', [STEREO_HEADER, MONO_HEADER])
+def test_xing_duration(write, header):
+    data = tag(3, frame(3, b'TIT2', text('Title'))) + xing_frame(5000, header) + audio_frame(header) * 10
+    assert read_duration(write(data)) == pytest.approx(5000 * FRAME_SECONDS)
+
+
+def test_vbri_duration(write):
+    assert read_duration(write(vbri_frame(3000) + audio_frame() * 10)) == pytest.approx(3000 * FRAME_SECONDS)
+
+
+def test_duration_skips_stray_sync_bytes(write):
+    data = b'\xff\x00\xff\xfb\x00' + audio_frame() * 10
+    assert read_duration(write(data)) == pytest.approx((len(data) - 5) * 8 / 128000)
+
+
+def test_unknown_duration_without_frames(write):
+    assert read_duration(write(tag(3, frame(3, b'TIT2', text('Title'))) + b'\x00' * 1000)) is None
+
+
+def test_index_frames_skips_the_vbr_frame_and_tags(write):
+    # enough frames to cross the read window more than once
+    prefix = tag(3, frame(3, b'TIT2', text('Title'))) + xing_frame(1500)
+    data = prefix + audio_frame() * 1500 + id3v1('Artist', 'Title', 'Album')
+    sample_rate, samples, offsets = index_frames(write(data))
+    assert (sample_rate, samples) == (44100, 1152)
+    assert list(offsets) == [len(prefix) + FRAME_SIZE * number for number in range(1501)]
+
+
+def test_index_frames_stops_at_a_trailing_tag(write):
+    data = audio_frame() * 20 + b'APETAGEX' + b'\x00' * 100
+    offsets = index_frames(write(data))[2]
+    assert len(offsets) == 21
+    assert offsets[-1] == 20 * FRAME_SIZE
@@ -0,0 +1,105 @@
+import pytest
+
+from modules.quiz_state import QUIZ_FIELDS, QuizState
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, state, changed):
+        self.calls.append(changed)
+
+
+@pytest.fixture
+def quiz():
+    # the scheduler only queues flushes, so each test decides when the event loop cycle ends
+    scheduled = []
+    state = QuizState(scheduled.append)
+    recorder = Recorder()
+    state.subscribe(recorder)
+    recorder.calls.clear()
+    return state, scheduled, recorder
+
+
+def run_cycle(scheduled):
+    pending = list(scheduled)
+    scheduled.clear()
+    for flush in pending:
+        flush()
+
+
+def test_subscribe_renders_every_field():
+    state = QuizState([].append)
+    recorder = Recorder()
+    state.subscribe(recorder)
+    assert recorder.calls == [frozenset(QUIZ_FIELDS)]
+
+
+def test_next_repaints_once(quiz):
+    state, scheduled, recorder = quiz
+    state.update(show_anime=True, show_artist=True, show_title=True)
+    run_cycle(scheduled)
+    recorder.calls.clear()
+
+    state.update(filename='a.mp3', anime='Anime', artist='Artist', title='Title')
+    state.update(count='1/10')
+    state.update(time=20, counting=False)
+    state.update(show_anime=False, show_artist=False, show_title=False)
+    assert len(scheduled) == 1
+    run_cycle(scheduled)
+    # counting was already False, so only the time joins the reveal and track fields
+    assert recorder.calls == [frozenset({'filename', 'anime', 'artist', 'title', 'count', 'time', 'show_anime',
+                                         'show_artist', 'show_title'})]
+
+
+def test_show_all_repaints_once(quiz):
+    state, scheduled, recorder = quiz
+    state.update(show_anime=True)
+    state.update(show_title=True)
+    state.update(show_artist=True)
+    assert len(scheduled) == 1
+    run_cycle(scheduled)
+    assert recorder.calls == [frozenset({'show_anime', 'show_artist', 'show_title'})]
+    assert state.revealed('anime') == '<>'
+
+
+def test_font_change_repaints_font_size_only(quiz):
+    state, scheduled, recorder = quiz
+    state.update(font_size=24)
+    run_cycle(scheduled)
+    assert recorder.calls == [frozenset({'font_size'})]
+
+
+def test_tick_repaints_time_and_counting(quiz):
+    state, scheduled, recorder = quiz
+    state.update(time=10, counting=False)
+    run_cycle(scheduled)
+    recorder.calls.clear()
+
+    state.update(time=9, counting=True)
+    run_cycle(scheduled)
+    state.update(time=8, counting=True)
+    run_cycle(scheduled)
+    assert recorder.calls == [frozenset({'time', 'counting'}), frozenset({'time'})]
+
+
+def test_set_then_revert_within_one_cycle_is_not_repainted(quiz):
+    state, scheduled, recorder = quiz
+    state.update(show_title=True)
+    state.update(show_title=False)
+    run_cycle(scheduled)
+    assert recorder.calls == []
+    assert scheduled == []
+
+
+def test_unchanged_update_schedules_nothing(quiz):
+    state, scheduled, recorder = quiz
+    state.update(filename='<>', count='0/0')
+    assert scheduled == []
+
+
+def test_unknown_field_raises(quiz):
+    state, _, _ = quiz
+    with pytest.raises(KeyError):
+        state.update(colour='red')